@@ -0,0 +1,183 @@
+class ClosureOverlay:
+    """
+    Class recording closed stations and connections of a TubeMap, consulted by
+    PathFinder at query time so that closures never require rebuilding the graph.
+
+    Stations are numbered by tubemap.station_index and connections by their
+    position in tubemap.connections, and their state is kept in one byte per item, so
+    opening or closing any of them is O(1).
+
+    Attributes:
+        station_index (dict): A dictionary mapping station ID (str) to its number.
+        connection_index (dict): A dictionary mapping id() of each Connection to its number.
+        closed_stations (bytearray): 1 for each closed station, 0 otherwise.
+        closed_connections (bytearray): 1 for each closed connection, 0 otherwise.
+        closed_count (int): The number of stations and connections currently closed.
+        version (int): Counter incremented on every change, so that cached
+                       results can detect they are stale.
+    """
+
+    def __init__(self, tubemap):
+        """
+        Args:
+            tubemap (TubeMap) : The TubeMap the closures apply to.
+        """
+        self.station_index = tubemap.station_index
+        self.connection_index = {id(connection): i for i, connection in enumerate(tubemap.connections)}
+        self.closed_stations = bytearray(len(self.station_index))
+        self.closed_connections = bytearray(len(self.connection_index))
+        self.closed_count = 0
+        self.version = 0
+
+    def is_active(self):
+        """ Returns True if at least one station or connection is closed."""
+        return self.closed_count > 0
+
+    def set_station(self, station_id, closed):
+        """ Opens or closes a station.
+
+        Args:
+            station_id (str): The ID of the station.
+            closed (bool): True to close the station, False to open it.
+
+        Returns:
+            None
+        """
+        i = self.station_index[station_id]
+        self.closed_count += int(closed) - self.closed_stations[i]
+        self.closed_stations[i] = int(closed)
+        self.version += 1
+
+    def set_connection(self, connection, closed):
+        """ Opens or closes a connection (one line between two stations).
+
+        Args:
+            connection (Connection): The connection, as found in tubemap.connections.
+            closed (bool): True to close the connection, False to open it.
+
+        Returns:
+            None
+        """
+        i = self.connection_index[id(connection)]
+        self.closed_count += int(closed) - self.closed_connections[i]
+        self.closed_connections[i] = int(closed)
+        self.version += 1
+
+    def close_station(self, station_id):
+        """ Closes a station, so no path can go through it."""
+        self.set_station(station_id, True)
+
+    def open_station(self, station_id):
+        """ Reopens a closed station."""
+        self.set_station(station_id, False)
+
+    def close_connection(self, connection):
+        """ Closes a connection, so no path can use it."""
+        self.set_connection(connection, True)
+
+    def open_connection(self, connection):
+        """ Reopens a closed connection."""
+        self.set_connection(connection, False)
+
+    def clear(self):
+        """ Reopens every station and connection."""
+        self.closed_stations = bytearray(len(self.closed_stations))
+        self.closed_connections = bytearray(len(self.closed_connections))
+        self.closed_count = 0
+        self.version += 1
+
+    def is_station_closed(self, station_id):
+        """ Returns True if the station is closed."""
+        return self.closed_stations[self.station_index[station_id]] == 1
+
+    def is_connection_closed(self, connection):
+        """ Returns True if the connection is closed."""
+        return self.closed_connections[self.connection_index[id(connection)]] == 1
+
+    def open_neighbours(self, station_id, neighbours):
+        """ Filters the neighbours of a station down to what is open.
+
+        Args:
+            station_id (str): The ID of the station.
+            neighbours (dict): The station's entry in the graph built by
+                NeighbourGraphBuilder, mapping neighbour ID to a list of Connections.
+
+        Yields:
+            tuple: (neighbour ID, list of open Connections) for every open
+                neighbour reachable through at least one open connection.
+                Nothing is yielded if the station itself is closed.
+        """
+        if self.is_station_closed(station_id):
+            return
+        for neighbour, connections in neighbours.items():
+            if self.is_station_closed(neighbour):
+                continue
+            open_connections = [connection for connection in connections
+                                if not self.is_connection_closed(connection)]
+            if open_connections:
+                yield neighbour, open_connections
+
+    def apply_change(self, event, item):
+        """ Keeps the numbering in sync after a change to the tube map.
+
+        New stations and connections start open. A removed connection loses its
+        number, and its slot is left unused so other numbers do not move. Calling
+        this more than once for the same change has no further effect.
+
+        Args:
+            event (str): The change, as notified by TubeMap.
+            item (Station or Connection): The changed item.
+
+        Returns:
+            None
+        """
+        if event == "station_added":
+            # station_index is shared with the tube map, only the bytes need to grow
+            missing = len(self.station_index) - len(self.closed_stations)
+            if missing > 0:
+                self.closed_stations.extend(bytearray(missing))
+        elif event == "connection_added" and id(item) not in self.connection_index:
+            self.connection_index[id(item)] = len(self.closed_connections)
+            self.closed_connections.append(0)
+        elif event == "connection_removed" and id(item) in self.connection_index:
+            i = self.connection_index.pop(id(item))
+            self.closed_count -= self.closed_connections[i]
+            self.closed_connections[i] = 0
+        else:
+            return
+        self.version += 1
+
+
+def test_closures():
+    from tube.map import TubeMap
+    from network.path import PathFinder
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    path_finder = PathFinder(tubemap, engine="heap")
+    hierarchy_finder = PathFinder(tubemap, engine="ch", closures=path_finder.closures)
+    closures = path_finder.closures
+    before = path_finder.get_journey("Covent Garden", "Green Park")
+
+    # A closed station is routed around, by every engine
+    leicester_square = tubemap.get_station_id("Leicester Square")
+    closures.close_station(leicester_square)
+    detour = path_finder.get_journey("Covent Garden", "Green Park")
+    assert leicester_square not in [station.id for station in detour.stations]
+    assert detour.total_time > before.total_time
+    assert hierarchy_finder.get_journey("Covent Garden", "Green Park").total_time == detour.total_time
+
+    # A closed connection is never used, and reopening restores the original path
+    closures.open_station(leicester_square)
+    closures.close_connection(before.connections[0])
+    assert before.connections[0] not in path_finder.get_journey("Covent Garden", "Green Park").connections
+    closures.clear()
+    assert not closures.is_active()
+    assert path_finder.get_journey("Covent Garden", "Green Park").total_time == before.total_time
+
+    # A closed destination cannot be reached
+    closures.close_station(tubemap.get_station_id("Green Park"))
+    assert path_finder.get_shortest_path("Covent Garden", "Green Park") is None
+
+
+if __name__ == "__main__":
+    test_closures()
@@ -0,0 +1,352 @@
+import heapq
+import json
+from json import JSONDecodeError
+
+
+class ContractionHierarchy:
+    """
+    Class to preprocess a station graph into a contraction hierarchy and answer
+    shortest path queries on it.
+
+    Stations are contracted one by one in order of importance. When a station is
+    contracted, shortcut edges are added between its remaining neighbours wherever
+    the path through the station is the only shortest one. A query then only needs
+    to search "upwards" (towards more important stations) from both ends.
+
+    Attributes:
+        rank (dict): A dictionary mapping station ID (str) to its contraction order (int).
+        up_graph (dict): A dictionary mapping station ID (str) to a dictionary
+                         {higher ranked neighbour ID (str): travel time (int)}.
+        middle (dict): A dictionary mapping (station ID, station ID) pairs of a
+                       shortcut to the ID of the contracted station it bypasses.
+        stale (bool): True once the tube map changed in a way this hierarchy does not
+                      reflect. PathFinder then searches the graph directly
+                      instead. Reset by build() and load().
+    """
+
+    def __init__(self):
+        """Initializes an empty hierarchy. Call build() or load() before querying."""
+        self.rank = {}
+        self.up_graph = {}
+        self.middle = {}
+        self.stale = False
+
+    def build(self, graph):
+        """ Builds the contraction hierarchy from a graph.
+
+        Args:
+            graph (dict): graph as returned by NeighbourGraphBuilder.build.
+
+        Returns:
+            ContractionHierarchy: self, to allow chaining.
+        """
+        # Working copy of the graph keeping only the minimum time per neighbour
+        remaining = {
+            station_id: {neighbour: min(connection.time for connection in connections)
+                         for neighbour, connections in neighbours.items()}
+            for station_id, neighbours in graph.items()
+        }
+        self.rank = {}
+        self.up_graph = {}
+        self.middle = {}
+        contracted_neighbours = {station_id: 0 for station_id in remaining}
+
+        # Priority queue of stations ordered by importance, updated lazily
+        queue = [(self.importance(remaining, station_id, contracted_neighbours), station_id)
+                 for station_id in remaining]
+        heapq.heapify(queue)
+
+        while queue:
+            _, station_id = heapq.heappop(queue)
+            if station_id in self.rank:
+                continue
+
+            # Lazy update: recompute the importance and requeue if no longer minimal
+            importance = self.importance(remaining, station_id, contracted_neighbours)
+            if queue and importance > queue[0][0]:
+                heapq.heappush(queue, (importance, station_id))
+                continue
+
+            self.rank[station_id] = len(self.rank)
+            neighbours = remaining.pop(station_id)
+            self.up_graph[station_id] = dict(neighbours)
+
+            for neighbour in neighbours:
+                del remaining[neighbour][station_id]
+                contracted_neighbours[neighbour] += 1
+
+            for source, target, time in self.find_shortcuts(remaining, station_id, neighbours):
+                if time < remaining[source].get(target, float('inf')):
+                    remaining[source][target] = time
+                    remaining[target][source] = time
+                    self.middle[(source, target)] = station_id
+                    self.middle[(target, source)] = station_id
+
+        self.stale = False
+        return self
+
+    def importance(self, remaining, station_id, contracted_neighbours):
+        """ Estimates how important a station is, lower values being contracted first.
+
+        Uses the edge difference (shortcuts added minus edges removed) plus the
+        number of already contracted neighbours, which spreads contraction evenly.
+
+        Args:
+            remaining (dict): The graph of stations not yet contracted.
+            station_id (str): The ID of the station to evaluate.
+            contracted_neighbours (dict): Number of contracted neighbours per station.
+
+        Returns:
+            int: The importance of the station.
+        """
+        neighbours = remaining[station_id]
+        shortcuts = self.find_shortcuts(remaining, station_id, neighbours)
+        return len(shortcuts) - len(neighbours) + contracted_neighbours[station_id]
+
+    def find_shortcuts(self, remaining, station_id, neighbours):
+        """ Finds the shortcuts needed if station_id were contracted.
+
+        For every pair of neighbours, a local witness search checks whether a path
+        avoiding station_id is at most as short as the path through it.
+
+        Args:
+            remaining (dict): The graph of stations not yet contracted.
+            station_id (str): The ID of the station to contract.
+            neighbours (dict): The neighbours of station_id and their travel times.
+
+        Returns:
+            list[tuple]: (source ID, target ID, travel time) for each shortcut.
+        """
+        shortcuts = []
+        neighbour_ids = [neighbour for neighbour in neighbours if neighbour != station_id]
+        for i, source in enumerate(neighbour_ids):
+            targets = {target: neighbours[source] + neighbours[target]
+                       for target in neighbour_ids[i + 1:]}
+            if not targets:
+                continue
+            witness = self.witness_search(remaining, source, station_id, max(targets.values()))
+            for target, time in targets.items():
+                if witness.get(target, float('inf')) > time:
+                    shortcuts.append((source, target, time))
+        return shortcuts
+
+    def witness_search(self, remaining, source, excluded_id, limit):
+        """ Runs a Dijkstra search from source that ignores excluded_id.
+
+        Args:
+            remaining (dict): The graph of stations not yet contracted.
+            source (str): The ID of the station to search from.
+            excluded_id (str): The ID of the station being contracted.
+            limit (int): Distances above this value are not explored.
+
+        Returns:
+            dict: A dictionary of station IDs and their distances from source.
+        """
+        dist = {source: 0}
+        heap = [(0, source)]
+        settled = set()
+        while heap:
+            station_dist, station_id = heapq.heappop(heap)
+            if station_id in settled:
+                continue
+            settled.add(station_id)
+            if station_dist > limit:
+                break
+            for neighbour, time in remaining[station_id].items():
+                if neighbour == excluded_id:
+                    continue
+                alt = station_dist + time
+                if alt < dist.get(neighbour, float('inf')):
+                    dist[neighbour] = alt
+                    heapq.heappush(heap, (alt, neighbour))
+        return dist
+
+    def query(self, start_station_id, end_station_id):
+        """ Finds a shortest path between two stations in the hierarchy.
+
+        Runs an upward Dijkstra search from both ends and joins them at the
+        station minimising the sum of both distances.
+
+        Args:
+            start_station_id (str): The ID of the starting station.
+            end_station_id (str): The ID of the ending station.
+
+        Returns:
+            list[str]: The station IDs along the shortest path, with all shortcuts
+                unpacked. Returns None if either station is unknown or no path exists.
+        """
+        if start_station_id not in self.up_graph or end_station_id not in self.up_graph:
+            return None
+
+        # Index 0 is the forward search, index 1 the backward search
+        dist = ({start_station_id: 0}, {end_station_id: 0})
+        prev = ({start_station_id: None}, {end_station_id: None})
+        heaps = ([(0, start_station_id)], [(0, end_station_id)])
+        settled = (set(), set())
+
+        mu = float('inf')
+        meeting_station_id = None
+
+        while heaps[0] or heaps[1]:
+            for side in (0, 1):
+                if not heaps[side]:
+                    continue
+                station_dist, station_id = heapq.heappop(heaps[side])
+                if station_id in settled[side]:
+                    continue
+                # This side cannot improve on mu any more
+                if station_dist >= mu:
+                    heaps[side].clear()
+                    continue
+                settled[side].add(station_id)
+
+                if station_id in dist[1 - side] and station_dist + dist[1 - side][station_id] < mu:
+                    mu = station_dist + dist[1 - side][station_id]
+                    meeting_station_id = station_id
+
+                for neighbour, time in self.up_graph[station_id].items():
+                    alt = station_dist + time
+                    if alt < dist[side].get(neighbour, float('inf')):
+                        dist[side][neighbour] = alt
+                        prev[side][neighbour] = station_id
+                        heapq.heappush(heaps[side], (alt, neighbour))
+
+        if meeting_station_id is None:
+            return None
+
+        # Join the two upward paths at the meeting station
+        forward = []
+        station_id = meeting_station_id
+        while station_id is not None:
+            forward.append(station_id)
+            station_id = prev[0][station_id]
+        forward = forward[::-1]
+
+        backward = []
+        station_id = prev[1][meeting_station_id]
+        while station_id is not None:
+            backward.append(station_id)
+            station_id = prev[1][station_id]
+
+        path = forward + backward
+        return self.unpack(path)
+
+    def unpack(self, path):
+        """ Replaces every shortcut in a path by the stations it bypasses.
+
+        Args:
+            path (list[str]): Station IDs, consecutive IDs possibly joined by shortcuts.
+
+        Returns:
+            list[str]: The station IDs along the same path in the original graph.
+        """
+        if not path:
+            return path
+        unpacked = [path[0]]
+        # Stack of edges left to unpack, processed from the start of the path
+        stack = [(path[i], path[i + 1]) for i in range(len(path) - 2, -1, -1)]
+        while stack:
+            source, target = stack.pop()
+            middle = self.middle.get((source, target))
+            if middle is None:
+                unpacked.append(target)
+            else:
+                stack.append((middle, target))
+                stack.append((source, middle))
+        return unpacked
+
+    def save(self, filepath):
+        """ Saves the hierarchy to a JSON file, so it can be preprocessed offline.
+
+        Args:
+            filepath (str): The path of the JSON file to write.
+
+        Returns:
+            None
+        """
+        data = {
+            'rank': self.rank,
+            'up_graph': self.up_graph,
+            'shortcuts': [[source, target, middle] for (source, target), middle in self.middle.items()],
+        }
+        with open(filepath, 'w') as json_file:
+            json.dump(data, json_file)
+
+    def load(self, filepath):
+        """ Loads a hierarchy previously written by save().
+
+        Args:
+            filepath (str): The path of the JSON file to read.
+
+        Returns:
+            ContractionHierarchy: self if loading succeeded, None otherwise.
+        """
+        try:
+            with open(filepath, 'r') as json_file:
+                data = json.load(json_file)
+        except (FileNotFoundError, JSONDecodeError, TypeError, OSError):
+            print('Invalid input to load function')
+            return None
+
+        # Parse everything before changing the hierarchy, so a file with the wrong shape loads nothing
+        try:
+            rank = {station_id: int(order) for station_id, order in data['rank'].items()}
+            up_graph = {station_id: dict(neighbours) for station_id, neighbours in data['up_graph'].items()}
+            middle = {(source, target): middle for source, target, middle in data['shortcuts']}
+        except (KeyError, TypeError, ValueError, AttributeError):
+            print('Invalid input to load function')
+            return None
+
+        self.rank = rank
+        self.up_graph = up_graph
+        self.middle = middle
+        self.stale = False
+        return self
+
+
+def test_contraction():
+    from tube.map import TubeMap
+    from network.graph import NeighbourGraphBuilder
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    graph = NeighbourGraphBuilder().build(tubemap)
+    hierarchy = ContractionHierarchy().build(graph)
+    print(f"{len(hierarchy.middle) // 2} shortcuts added")
+
+    conversion_dict = tubemap.name_index
+    path = hierarchy.query(conversion_dict["Covent Garden"], conversion_dict["Green Park"])
+    station_names = [tubemap.stations[station_id].name for station_id in path]
+    expected = ["Covent Garden", "Leicester Square", "Piccadilly Circus",
+                "Green Park"]
+    assert station_names == expected
+
+
+def test_hierarchy_file():
+    import os
+    import tempfile
+    from tube.map import TubeMap
+    from network.graph import NeighbourGraphBuilder
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    hierarchy = ContractionHierarchy().build(NeighbourGraphBuilder().build(tubemap))
+    start, end = tubemap.name_index["Upminster"], tubemap.name_index["Ealing Broadway"]
+
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = os.path.join(directory, "hierarchy.json")
+        hierarchy.save(filepath)
+        loaded = ContractionHierarchy().load(filepath)
+        assert (loaded.rank, loaded.up_graph, loaded.middle) == (hierarchy.rank, hierarchy.up_graph, hierarchy.middle)
+        assert loaded.query(start, end) == hierarchy.query(start, end)
+
+        # Files with the wrong shape are rejected, not half loaded
+        for data in ({}, {'rank': {}, 'up_graph': {}}, {'rank': [], 'up_graph': {}, 'shortcuts': []},
+                     {'rank': {}, 'up_graph': {}, 'shortcuts': [[1, 2]]}, []):
+            with open(filepath, 'w') as json_file:
+                json.dump(data, json_file)
+            assert loaded.load(filepath) is None
+        assert loaded.query(start, end) == hierarchy.query(start, end)
+
+
+if __name__ == "__main__":
+    test_contraction()
+    test_hierarchy_file()
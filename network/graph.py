@@ -1,8 +1,68 @@
+from array import array
+
+
+class CSRGraph:
+    """ Compact (compressed sparse row) representation of the station graph.
+
+    Stations are numbered 0..N-1 as in TubeMap.station_index. The edges leaving station i are stored at
+    positions offsets[i] to offsets[i + 1] - 1 of the targets, weights and
+    line_ids arrays, one entry per Connection and direction. Parallel
+    connections on different lines are kept as separate edges.
+
+    Attributes:
+        station_ids (list): The station ID (str) of each station number.
+        index (dict): A dictionary mapping station ID (str) to its station number.
+        line_keys (list): The line ID (str) of each line number.
+        offsets (array): N + 1 edge offsets, one per station plus the end.
+        targets (array): The station number each edge leads to.
+        weights (array): The travel time of each edge in minutes.
+        line_ids (array): The line number of each edge.
+        stale (bool): True once the tube map changed since the graph was built.
+                      PathFinder then searches its adjacency lists instead,
+                      until the graph is built again.
+    """
+
+    def __init__(self):
+        """Initializes an empty graph."""
+        self.station_ids = []
+        self.index = {}
+        self.line_keys = []
+        self.offsets = array('i', [0])
+        self.targets = array('i')
+        self.weights = array('i')
+        self.line_ids = array('i')
+        self.stale = False
+
+    def neighbours(self, station):
+        """ Lists the edges leaving a station.
+
+        Args:
+            station (int): The station number.
+
+        Returns:
+            range: The positions of the station's edges in targets, weights and line_ids.
+        """
+        return range(self.offsets[station], self.offsets[station + 1])
+
+    def nbytes(self):
+        """ Returns the memory used by the edge arrays in bytes."""
+        return sum(values.itemsize * len(values)
+                   for values in (self.offsets, self.targets, self.weights, self.line_ids))
+
+
 class NeighbourGraphBuilder:
     """ Class to build a graph of neighbouring connections between stations."""
 
-    def __init__(self):
-        pass
+    def __init__(self, collapse_parallel=False):
+        """
+        Args:
+            collapse_parallel (bool) : If True, build() also precomputes the
+                fastest connection between each pair of neighbouring stations,
+                stored in `min_connections` and `min_times`.
+        """
+        self.collapse_parallel = collapse_parallel
+        self.min_connections = {}   # station id -> neighbour id -> fastest Connection
+        self.min_times = {}         # station id -> neighbour id -> time of fastest Connection
 
     def build(self, tubemap):
         """ Builds a graph encoding neighbouring connections between stations.
@@ -84,8 +144,83 @@ class NeighbourGraphBuilder:
             print('Input to build function is invalid, returning empty dict for graph variable.')
             graph = {}
 
+        if self.collapse_parallel:
+            self.collapse(graph)
+
         return graph
 
+    def collapse(self, graph):
+        """ Precomputes the fastest connection between each pair of neighbouring stations.
+
+        Searches only need the minimum time over the parallel connections
+        between two stations (for instance the Circle, Hammersmith & City and
+        Metropolitan lines between Baker Street and Great Portland Street), so
+        it is computed once here rather than on every relaxation. The full
+        lists stay available in the graph for line-aware searches.
+
+        Args:
+            graph (dict): graph as returned by build().
+
+        Returns:
+            None. The results are stored in `min_connections` and `min_times`.
+        """
+        self.min_connections = {
+            station_id: {neighbour: min(connections, key=lambda connection: connection.time)
+                         for neighbour, connections in neighbours.items()}
+            for station_id, neighbours in graph.items()
+        }
+        self.min_times = {
+            station_id: {neighbour: connection.time for neighbour, connection in neighbours.items()}
+            for station_id, neighbours in self.min_connections.items()
+        }
+
+    def build_csr(self, tubemap):
+        """ Builds the graph as contiguous arrays indexed by station number.
+
+        Unlike build(), which returns nested dictionaries of Connection lists, the
+        result stores each edge as a few integers in flat arrays (see CSRGraph).
+
+        Args:
+            tubemap (TubeMap) : tube map serving as a reference for building
+                the graph.
+
+        Returns:
+            CSRGraph : the compact graph.
+                If the input data (tubemap) is invalid, the method returns an
+                empty CSRGraph.
+        """
+        csr = CSRGraph()
+
+        try:
+            # Station numbers are the dense numbers assigned by the tube map
+            csr.station_ids = list(tubemap.station_ids)
+            csr.index = dict(tubemap.station_index)
+            csr.line_keys = list(tubemap.lines)
+            line_index = {line_id: i for i, line_id in enumerate(csr.line_keys)}
+
+            # Collect the edges of each station, in both directions
+            edges = [[] for _ in csr.station_ids]
+            for connection in tubemap.connections:
+                stationA, stationB = connection.stations
+                a, b = csr.index[stationA.id], csr.index[stationB.id]
+                line = line_index[connection.line.id]
+                edges[a].append((b, connection.time, line))
+                edges[b].append((a, connection.time, line))
+        except AttributeError:
+            print('Input to build_csr function is invalid, returning empty graph.')
+            return CSRGraph()
+
+        offsets = [0]
+        for station_edges in edges:
+            for target, weight, line in station_edges:
+                csr.targets.append(target)
+                csr.weights.append(weight)
+                csr.line_ids.append(line)
+            offsets.append(len(csr.targets))
+        csr.offsets = array('i', offsets)
+
+        return csr
+
     def add_to_station_neighbours(self, graph, station1, station2, connection):
         """
             Adds a connection between two stations (station1 and station2) to a graph
@@ -116,6 +251,82 @@ class NeighbourGraphBuilder:
 
         return
 
+    def remove_from_station_neighbours(self, graph, station1, station2, connection):
+        """
+            Removes a connection from the edge between two stations (station1 and
+            station2) of a graph of station neighbours. The reverse of
+            add_to_station_neighbours. A neighbour entry left without connections
+            is deleted, but station1 keeps its (possibly empty) entry, so it is
+            still a known station of the graph.
+
+            Args:
+                graph (dict): The graph as built by build().
+                station1 (Station): The first station in the connection.
+                station2 (Station): The second station in the connection.
+                connection (Connection): The connection instance to remove.
+
+            Returns:
+                None
+            """
+        connections = graph.get(station1.id, {}).get(station2.id)
+        if connections is None:
+            return
+        # Compare by identity, parallel connections may look alike
+        graph[station1.id][station2.id] = [other for other in connections if other is not connection]
+        if not graph[station1.id][station2.id]:
+            del graph[station1.id][station2.id]
+
+    def update_min_connection(self, graph, station1, station2):
+        """
+            Recomputes the fastest connection from station1 to station2 after the
+            connections between them changed (only if collapse_parallel is set).
+
+            Args:
+                graph (dict): The graph as built by build().
+                station1 (Station): The first station.
+                station2 (Station): The second station.
+
+            Returns:
+                None
+            """
+        if not self.collapse_parallel:
+            return
+        connections = graph.get(station1.id, {}).get(station2.id)
+        if connections:
+            connection = min(connections, key=lambda connection: connection.time)
+            self.min_connections.setdefault(station1.id, {})[station2.id] = connection
+            self.min_times.setdefault(station1.id, {})[station2.id] = connection.time
+        else:
+            self.min_connections.get(station1.id, {}).pop(station2.id, None)
+            self.min_times.get(station1.id, {}).pop(station2.id, None)
+
+    def apply_change(self, graph, event, item):
+        """
+            Updates a graph in place after a change to the tube map, instead of
+            rebuilding it. Only the entries of the two stations of the changed
+            connection are touched, so the cost is proportional to their degree.
+
+            Args:
+                graph (dict): The graph as built by build().
+                event (str): The change, as notified by TubeMap (for instance
+                             "connection_added").
+                item (Connection): The changed connection.
+
+            Returns:
+                None
+            """
+        if event not in ("connection_added", "connection_removed", "connection_time_changed"):
+            return
+
+        stationA, stationB = item.stations
+        for station1, station2 in ((stationA, stationB), (stationB, stationA)):
+            if event == "connection_added":
+                self.add_to_station_neighbours(graph, station1, station2, item)
+            elif event == "connection_removed":
+                self.remove_from_station_neighbours(graph, station1, station2, item)
+            self.update_min_connection(graph, station1, station2)
+
+
 def test_graph():
     from tube.map import TubeMap
     tubemap = TubeMap()
@@ -124,5 +335,64 @@ def test_graph():
     graph = graph_builder.build(tubemap)
     print(graph)
 
+
+def test_csr_graph():
+    from tube.map import TubeMap
+    from network.path import PathFinder
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    graph_builder = NeighbourGraphBuilder()
+    graph = graph_builder.build(tubemap)
+    csr = graph_builder.build_csr(tubemap)
+    assert len(csr.targets) == 2 * len(tubemap.connections)
+
+    # Same edges as the dictionary graph, one per connection and direction
+    for station_id, neighbours in graph.items():
+        station = csr.index[station_id]
+        edges = sorted((csr.station_ids[csr.targets[i]], csr.weights[i], csr.line_keys[csr.line_ids[i]])
+                       for i in csr.neighbours(station))
+        assert edges == sorted((neighbour, connection.time, connection.line.id)
+                               for neighbour, connections in neighbours.items()
+                               for connection in connections)
+
+    # The CSR engine finds paths as short as the dictionary-based one
+    csr_finder = PathFinder(tubemap, engine="csr")
+    heap_finder = PathFinder(tubemap, engine="heap")
+    for start, end in [("Covent Garden", "Green Park"), ("Ealing Broadway", "Upminster"),
+                       ("Brixton", "Walthamstow Central")]:
+        assert csr_finder.get_journey(start, end).total_time == heap_finder.get_journey(start, end).total_time
+
+
+def test_collapse_parallel():
+    from tube.map import TubeMap
+    from tube.components import Connection
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    assert NeighbourGraphBuilder().min_times == {}
+    graph_builder = NeighbourGraphBuilder(collapse_parallel=True)
+    graph = graph_builder.build(tubemap)
+
+    # Fastest of the parallel connections, for every pair of neighbours
+    for station_id, neighbours in graph.items():
+        for neighbour, connections in neighbours.items():
+            assert graph_builder.min_times[station_id][neighbour] == min(c.time for c in connections)
+            assert graph_builder.min_connections[station_id][neighbour] in connections
+
+    # Baker Street and Great Portland Street are linked by several lines
+    baker_street = tubemap.get_station_id("Baker Street")
+    great_portland_street = tubemap.get_station_id("Great Portland Street")
+    assert len(graph[baker_street][great_portland_street]) > 1
+
+    # A faster parallel connection becomes the fastest one, until it is removed
+    time = graph_builder.min_times[baker_street][great_portland_street]
+    faster = Connection({tubemap.stations[baker_street], tubemap.stations[great_portland_street]},
+                        tubemap.lines["4"], time - 1)
+    graph_builder.apply_change(graph, "connection_added", faster)
+    assert graph_builder.min_connections[great_portland_street][baker_street] is faster
+    graph_builder.apply_change(graph, "connection_removed", faster)
+    assert graph_builder.min_times[baker_street][great_portland_street] == time
+
 if __name__ == "__main__":
     test_graph()
+    test_csr_graph()
+    test_collapse_parallel()
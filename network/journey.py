@@ -0,0 +1,68 @@
+class Leg:
+    """
+    A part of a journey travelled on a single line without changing.
+
+    Attributes:
+        line (Line): The line used for the whole leg.
+        stations (list): The Station objects visited, including both ends.
+        connections (list): The Connection taken between each pair of consecutive stations.
+        time (int): The travel time of the leg in minutes.
+    """
+
+    def __init__(self, line):
+        """
+        Args:
+            line (Line) : The line used for the leg.
+        """
+        self.line = line
+        self.stations = []
+        self.connections = []
+        self.time = 0
+
+    def __repr__(self):
+        return (f"Leg({self.line.name}, {self.stations[0].name} -> "
+                f"{self.stations[-1].name}, {self.time})")
+
+
+class Journey:
+    """
+    The result of a path search: the stations visited, the Connection chosen for
+    each hop, and the hops grouped into legs on the same line.
+
+    Attributes:
+        stations (list): The Station objects along the path, as returned by
+                         PathFinder.get_shortest_path.
+        connections (list): The Connection taken for each hop, so
+                            len(connections) == len(stations) - 1.
+        legs (list): The Leg objects of the journey, a new leg starting at every
+                     change of line.
+        total_time (int): The travel time of the journey in minutes.
+    """
+
+    def __init__(self, stations, connections):
+        """
+        Args:
+            stations (list[Station]) : The stations along the path.
+            connections (list[Connection]) : The connection used for each hop.
+        """
+        self.stations = stations
+        self.connections = connections
+        self.total_time = sum(connection.time for connection in connections)
+
+        self.legs = []
+        for i, connection in enumerate(connections):
+            if not self.legs or self.legs[-1].line.id != connection.line.id:
+                leg = Leg(connection.line)
+                leg.stations.append(stations[i])
+                self.legs.append(leg)
+            leg = self.legs[-1]
+            leg.stations.append(stations[i + 1])
+            leg.connections.append(connection)
+            leg.time += connection.time
+
+    def changes(self):
+        """ Returns the number of line changes along the journey."""
+        return max(len(self.legs) - 1, 0)
+
+    def __repr__(self):
+        return f"Journey({self.legs}, {self.total_time})"
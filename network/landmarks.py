@@ -0,0 +1,212 @@
+import heapq
+import json
+from json import JSONDecodeError
+
+
+class LandmarkTable:
+    """
+    Class holding precomputed travel times between landmark stations and every
+    other station, used as an A* heuristic (ALT: A*, Landmarks, Triangle inequality).
+
+    For any landmark L and stations v, t, the triangle inequality gives
+        d(v, t) >= |d(L, t) - d(L, v)|
+    so the maximum over all landmarks is an admissible lower bound on d(v, t).
+    The tube graph is undirected, so distances from and to a landmark are equal
+    and a single table per landmark is stored.
+
+    Attributes:
+        landmarks (list): The IDs (str) of the landmark stations.
+        distances (list): One dictionary per landmark, mapping station ID (str)
+                          to its travel time from that landmark (int).
+        stale (bool): True once the tube map changed in a way this table does not
+                      reflect. PathFinder then searches the graph directly
+                      instead. Reset by build() and load().
+    """
+
+    def __init__(self):
+        """Initializes an empty table. Call build() or load() before use."""
+        self.landmarks = []
+        self.distances = []
+        self.stale = False
+
+    def build(self, graph, num_landmarks=8):
+        """ Chooses landmarks with a farthest-point strategy and computes their distances.
+
+        The first landmark is the station farthest from an arbitrary station. Each
+        next landmark is the station whose distance to its closest landmark is largest.
+
+        Args:
+            graph (dict): graph as returned by NeighbourGraphBuilder.build.
+            num_landmarks (int): The number of landmarks to choose.
+
+        Returns:
+            LandmarkTable: self, to allow chaining.
+        """
+        self.landmarks = []
+        self.distances = []
+        self.stale = False
+        if not graph:
+            return self
+
+        # Distance from each station to its closest landmark chosen so far.
+        # Before any landmark is chosen, an arbitrary station is used instead.
+        closest = self.shortest_distances(graph, next(iter(graph)))
+
+        for i in range(min(num_landmarks, len(graph))):
+            # Unreachable stations are skipped, they would give no useful bounds
+            candidates = {station_id: distance for station_id, distance in closest.items()
+                          if distance != float('inf') and station_id not in self.landmarks}
+            if not candidates:
+                break
+            landmark = max(candidates, key=candidates.get)
+            distances = self.shortest_distances(graph, landmark)
+            self.landmarks.append(landmark)
+            self.distances.append(distances)
+            if i == 0:
+                closest = distances
+            else:
+                closest = {station_id: min(distance, distances[station_id])
+                           for station_id, distance in closest.items()}
+
+        return self
+
+    def shortest_distances(self, graph, source):
+        """ Runs a full Dijkstra search from source.
+
+        Args:
+            graph (dict): graph as returned by NeighbourGraphBuilder.build.
+            source (str): The ID of the station to search from.
+
+        Returns:
+            dict: A dictionary mapping every station ID in the graph to its travel
+                time from source (infinity if unreachable).
+        """
+        dist = {station_id: float('inf') for station_id in graph}
+        dist[source] = 0
+        heap = [(0, source)]
+        while heap:
+            station_dist, station_id = heapq.heappop(heap)
+            if station_dist > dist[station_id]:
+                continue
+            for neighbour, connections in graph[station_id].items():
+                alt = station_dist + min(connection.time for connection in connections)
+                if alt < dist[neighbour]:
+                    dist[neighbour] = alt
+                    heapq.heappush(heap, (alt, neighbour))
+        return dist
+
+    def lower_bound(self, station_id, end_station_id):
+        """ Lower bound on the travel time between two stations.
+
+        Args:
+            station_id (str): The ID of the current station.
+            end_station_id (str): The ID of the ending station.
+
+        Returns:
+            float: The best triangle-inequality bound over all landmarks.
+        """
+        bound = 0
+        for distances in self.distances:
+            to_station = distances.get(station_id, float('inf'))
+            to_end = distances.get(end_station_id, float('inf'))
+            # Stations not reachable from the landmark give no information
+            if to_station == float('inf') or to_end == float('inf'):
+                continue
+            bound = max(bound, abs(to_end - to_station))
+        return bound
+
+    def save(self, filepath):
+        """ Saves the landmark tables to a JSON file (for instance next to data/london.json).
+
+        Args:
+            filepath (str): The path of the JSON file to write.
+
+        Returns:
+            None
+        """
+        data = {
+            'landmarks': self.landmarks,
+            # Unreachable stations are left out, as JSON has no infinity
+            'distances': [{station_id: distance for station_id, distance in distances.items()
+                           if distance != float('inf')} for distances in self.distances],
+        }
+        with open(filepath, 'w') as json_file:
+            json.dump(data, json_file)
+
+    def load(self, filepath):
+        """ Loads landmark tables previously written by save().
+
+        Args:
+            filepath (str): The path of the JSON file to read.
+
+        Returns:
+            LandmarkTable: self if loading succeeded, None otherwise.
+        """
+        try:
+            with open(filepath, 'r') as json_file:
+                data = json.load(json_file)
+        except (FileNotFoundError, JSONDecodeError, TypeError, OSError):
+            print('Invalid input to load function')
+            return None
+
+        # Parse everything before changing the table, so a file with the wrong shape loads nothing
+        try:
+            landmarks = [str(station_id) for station_id in data['landmarks']]
+            distances = [dict(distances) for distances in data['distances']]
+            if len(distances) != len(landmarks):
+                raise ValueError('one distance table per landmark expected')
+        except (KeyError, TypeError, ValueError):
+            print('Invalid input to load function')
+            return None
+
+        self.landmarks = landmarks
+        self.distances = distances
+        self.stale = False
+        return self
+
+
+def test_landmarks():
+    from tube.map import TubeMap
+    from network.graph import NeighbourGraphBuilder
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    graph = NeighbourGraphBuilder().build(tubemap)
+    table = LandmarkTable().build(graph, num_landmarks=8)
+    print([tubemap.stations[station_id].name for station_id in table.landmarks])
+
+    # The bound must never exceed the true travel time
+    conversion_dict = tubemap.name_index
+    start = conversion_dict["Upminster"]
+    end = conversion_dict["Ealing Broadway"]
+    assert table.lower_bound(start, end) <= table.shortest_distances(graph, start)[end]
+
+
+def test_landmark_file():
+    import os
+    import tempfile
+    from tube.map import TubeMap
+    from network.graph import NeighbourGraphBuilder
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    table = LandmarkTable().build(NeighbourGraphBuilder().build(tubemap), num_landmarks=8)
+    start, end = tubemap.name_index["Upminster"], tubemap.name_index["Ealing Broadway"]
+
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = os.path.join(directory, "landmarks.json")
+        table.save(filepath)
+        loaded = LandmarkTable().load(filepath)
+        assert (loaded.landmarks, loaded.distances) == (table.landmarks, table.distances)
+        assert loaded.lower_bound(start, end) == table.lower_bound(start, end)
+
+        # Files with the wrong shape are rejected, not half loaded
+        for data in ({}, {'landmarks': ["1"]}, {'landmarks': ["1"], 'distances': [{}, {}]},
+                     {'landmarks': ["1"], 'distances': [5]}, []):
+            with open(filepath, 'w') as json_file:
+                json.dump(data, json_file)
+            assert loaded.load(filepath) is None
+        assert loaded.landmarks == table.landmarks
+
+
+if __name__ == "__main__":
+    test_landmarks()
+    test_landmark_file()
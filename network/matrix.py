@@ -0,0 +1,308 @@
+import json
+import mmap
+import struct
+import numpy as np
+
+# Header of the binary table format: magic bytes, number of stations,
+# distance/next-hop item size in bytes and length of the station ID block
+TABLE_MAGIC = b'TUBETBL1'
+TABLE_HEADER = struct.Struct('<8sIII')
+
+
+def direct_times(tubemap):
+    """ Builds the station x station matrix of direct connection times.
+
+    Args:
+        tubemap (TubeMap) : tube map to read the connections from.
+
+    Returns:
+        tuple: (station_ids, times) where
+            - station_ids (list[str]) gives the station ID of each row/column,
+            - times (numpy.ndarray) is an N x N float array holding the time of the
+              fastest connection between two stations, 0 on the diagonal and
+              numpy.inf where there is no direct connection.
+    """
+    station_ids = list(tubemap.station_ids)
+    index = tubemap.station_index
+
+    times = np.full((len(station_ids), len(station_ids)), np.inf)
+    np.fill_diagonal(times, 0)
+
+    # Keep the fastest connection between each pair of stations
+    for connection in tubemap.connections:
+        stationA, stationB = connection.stations
+        i, j = index[stationA.id], index[stationB.id]
+        if connection.time < times[i, j]:
+            times[i, j] = connection.time
+            times[j, i] = connection.time
+
+    return station_ids, times
+
+
+def all_pairs_times(tubemap):
+    """ Computes the minimum travel time between every pair of stations.
+
+    Builds the station x station matrix of direct connection times from
+    tubemap.connections, then runs Floyd-Warshall where each of the N steps
+    is a single vectorized min-plus update over the whole matrix:
+        times = min(times, times[:, k] + times[k, :])
+
+    Args:
+        tubemap (TubeMap) : tube map to compute the travel times for.
+
+    Returns:
+        tuple: (station_ids, times) where
+            - station_ids (list[str]) gives the station ID of each row/column,
+            - times (numpy.ndarray) is an N x N float array of travel times
+              in minutes, with numpy.inf for unreachable pairs.
+    """
+    station_ids, times = direct_times(tubemap)
+
+    for k in range(len(station_ids)):
+        np.minimum(times, times[:, k, np.newaxis] + times[np.newaxis, k, :], out=times)
+
+    return station_ids, times
+
+
+def all_pairs_next_hops(tubemap):
+    """ Computes all-pairs travel times together with the next-hop matrix.
+
+    next_hops[i, j] is the index of the station to go to from station i on a
+    shortest path to station j. Following next hops from i until j is reached
+    gives the full path.
+
+    Args:
+        tubemap (TubeMap) : tube map to compute the tables for.
+
+    Returns:
+        tuple: (station_ids, times, next_hops) where next_hops (numpy.ndarray)
+            is an N x N int array, with -1 for unreachable pairs.
+    """
+    station_ids, times = direct_times(tubemap)
+    n = len(station_ids)
+
+    # Initially the next hop towards a direct neighbour is the neighbour itself
+    next_hops = np.where(np.isfinite(times), np.arange(n)[np.newaxis, :], -1)
+
+    for k in range(n):
+        candidate = times[:, k, np.newaxis] + times[np.newaxis, k, :]
+        shorter = candidate < times
+        times = np.where(shorter, candidate, times)
+        # Going through k: the first hop is the first hop towards k
+        next_hops = np.where(shorter, next_hops[:, k, np.newaxis], next_hops)
+
+    return station_ids, times, next_hops
+
+
+class DistanceTable:
+    """
+    Class holding precomputed all-pairs travel times and next hops, stored in
+    a compact binary file that is opened with mmap.
+
+    Since the file is mapped read-only, several worker processes opening the
+    same file share the same physical pages instead of each loading a copy.
+
+    File layout (little endian):
+        header: magic (8 bytes), N (uint32), item size (uint32), ID block length (uint32)
+        station IDs: JSON list of str, padded to a multiple of 8 bytes
+        times: N x N int16/int32 matrix, -1 for unreachable pairs
+        next hops: N x N int16/int32 matrix, -1 for unreachable pairs
+
+    Attributes:
+        station_ids (list): The station ID (str) of each row/column.
+        index (dict): A dictionary mapping station ID (str) to its row/column.
+        times (numpy.ndarray): N x N travel times, -1 for unreachable pairs.
+        next_hops (numpy.ndarray): N x N next-hop indices, -1 for unreachable pairs.
+        stale (bool): True once the tube map changed in a way this table does not
+                      reflect. PathFinder then searches the graph directly
+                      instead. Reset by build() and load().
+    """
+
+    def __init__(self):
+        """Initializes an empty table. Call build() or load() before use."""
+        self.station_ids = []
+        self.index = {}
+        self.times = None
+        self.next_hops = None
+        self.mapped_file = None
+        self.stale = False
+
+    def build(self, tubemap):
+        """ Computes the tables in memory from a tube map.
+
+        Args:
+            tubemap (TubeMap) : tube map to compute the tables for.
+
+        Returns:
+            DistanceTable: self, to allow chaining.
+        """
+        station_ids, times, next_hops = all_pairs_next_hops(tubemap)
+        # Use 16 bit integers whenever both tables fit
+        finite = times[np.isfinite(times)]
+        largest = max(len(station_ids), int(finite.max()) if finite.size else 0)
+        dtype = np.int16 if largest < np.iinfo(np.int16).max else np.int32
+
+        self.station_ids = station_ids
+        self.index = {station_id: i for i, station_id in enumerate(station_ids)}
+        self.times = np.where(np.isfinite(times), times, -1).astype(dtype)
+        self.next_hops = next_hops.astype(dtype)
+        self.stale = False
+        return self
+
+    def save(self, filepath):
+        """ Writes the tables to a binary file.
+
+        Args:
+            filepath (str): The path of the file to write.
+
+        Returns:
+            None
+        """
+        ids_block = json.dumps(self.station_ids).encode()
+        ids_block += b' ' * (-len(ids_block) % 8)
+        with open(filepath, 'wb') as table_file:
+            table_file.write(TABLE_HEADER.pack(TABLE_MAGIC, len(self.station_ids),
+                                               self.times.itemsize, len(ids_block)))
+            table_file.write(ids_block)
+            table_file.write(self.times.astype(self.times.dtype.newbyteorder('<')).tobytes())
+            table_file.write(self.next_hops.astype(self.next_hops.dtype.newbyteorder('<')).tobytes())
+
+    def load(self, filepath):
+        """ Maps a file previously written by save() into memory.
+
+        The matrices are read-only views over the mapped pages, nothing is copied.
+
+        Args:
+            filepath (str): The path of the file to read.
+
+        Returns:
+            DistanceTable: self if loading succeeded, None otherwise.
+        """
+        try:
+            with open(filepath, 'rb') as table_file:
+                mapped_file = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, TypeError, OSError, ValueError):
+            print('Invalid input to load function')
+            return None
+
+        try:
+            magic, n, itemsize, ids_length = TABLE_HEADER.unpack_from(mapped_file, 0)
+            if magic != TABLE_MAGIC or itemsize not in (2, 4):
+                raise ValueError('not a distance table file')
+
+            offset = TABLE_HEADER.size
+            station_ids = json.loads(mapped_file[offset:offset + ids_length])
+            offset += ids_length
+
+            # frombuffer raises ValueError if the file is too short for the matrices
+            dtype = np.dtype('<i2') if itemsize == 2 else np.dtype('<i4')
+            times = np.frombuffer(mapped_file, dtype=dtype, count=n * n, offset=offset).reshape(n, n)
+            offset += n * n * itemsize
+            next_hops = np.frombuffer(mapped_file, dtype=dtype, count=n * n, offset=offset).reshape(n, n)
+        except (struct.error, ValueError):
+            # Truncated or corrupted file (JSONDecodeError is a ValueError too)
+            print('Invalid input to load function')
+            # Views over the mapped pages must be released before closing them
+            times = next_hops = None
+            mapped_file.close()
+            return None
+
+        self.station_ids = station_ids
+        self.index = {station_id: i for i, station_id in enumerate(station_ids)}
+        self.times = times
+        self.next_hops = next_hops
+        self.mapped_file = mapped_file
+        self.stale = False
+        return self
+
+    def travel_time(self, start_station_id, end_station_id):
+        """ Looks up the minimum travel time between two stations.
+
+        Args:
+            start_station_id (str): The ID of the starting station.
+            end_station_id (str): The ID of the ending station.
+
+        Returns:
+            int: The travel time in minutes, or None if there is no path or
+                either station is unknown.
+        """
+        if start_station_id not in self.index or end_station_id not in self.index:
+            return None
+        time = int(self.times[self.index[start_station_id], self.index[end_station_id]])
+        return None if time < 0 else time
+
+    def path(self, start_station_id, end_station_id):
+        """ Walks the next-hop table from the start to the end station.
+
+        Args:
+            start_station_id (str): The ID of the starting station.
+            end_station_id (str): The ID of the ending station.
+
+        Returns:
+            list[str]: The station IDs along the shortest path, or None if there
+                is no path or either station is unknown.
+        """
+        if start_station_id not in self.index or end_station_id not in self.index:
+            return None
+        current, end = self.index[start_station_id], self.index[end_station_id]
+        if self.next_hops[current, end] < 0:
+            return None
+
+        id_path = [self.station_ids[current]]
+        while current != end:
+            current = int(self.next_hops[current, end])
+            id_path.append(self.station_ids[current])
+        return id_path
+
+
+def test_all_pairs_times():
+    from tube.map import TubeMap
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    station_ids, times = all_pairs_times(tubemap)
+    print(times.shape)
+
+    # Covent Garden -> Leicester Square -> Piccadilly Circus -> Green Park
+    conversion_dict = tubemap.name_index
+    start = station_ids.index(conversion_dict["Covent Garden"])
+    end = station_ids.index(conversion_dict["Green Park"])
+    assert times[start, end] == times[end, start] == 4
+
+    table = DistanceTable().build(tubemap)
+    station_names = [tubemap.stations[station_id].name
+                     for station_id in table.path(station_ids[start], station_ids[end])]
+    expected = ["Covent Garden", "Leicester Square", "Piccadilly Circus",
+                "Green Park"]
+    assert station_names == expected
+    assert table.travel_time("unknown", station_ids[end]) is None
+
+
+def test_table_file():
+    import os
+    import tempfile
+    from tube.map import TubeMap
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    table = DistanceTable().build(tubemap)
+    start, end = tubemap.name_index["Covent Garden"], tubemap.name_index["Green Park"]
+
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = os.path.join(directory, "table.bin")
+        table.save(filepath)
+        loaded = DistanceTable().load(filepath)
+        assert loaded.travel_time(start, end) == 4
+        assert loaded.path(start, end) == table.path(start, end)
+        del loaded
+
+        # Truncated files are rejected, not half loaded
+        with open(filepath, 'rb') as table_file:
+            data = table_file.read()
+        for length in (0, 10, len(data) // 2):
+            with open(filepath, 'wb') as table_file:
+                table_file.write(data[:length])
+            assert DistanceTable().load(filepath) is None
+
+
+if __name__ == "__main__":
+    test_all_pairs_times()
+    test_table_file()
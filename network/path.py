@@ -1,114 +1,1583 @@
+import heapq
+import math
+from collections import OrderedDict
+from network.closures import ClosureOverlay
+from network.contraction import ContractionHierarchy
 from network.graph import NeighbourGraphBuilder
+from network.journey import Journey
+from network.landmarks import LandmarkTable
+
+# Mean radius of the Earth in kilometres, used for great-circle distances
+EARTH_RADIUS_KM = 6371.0
+
+
+def great_circle_distance(station1, station2):
+    """ Computes the great-circle (haversine) distance between two stations.
+
+    Args:
+        station1 (Station): The first station, with latitude and longitude.
+        station2 (Station): The second station, with latitude and longitude.
+
+    Returns:
+        float: Distance in kilometres. Returns 0 if either station has no
+            coordinates, so that it remains a valid lower bound.
+    """
+    if None in (station1.latitude, station1.longitude, station2.latitude, station2.longitude):
+        return 0.0
+    lat1, lon1 = math.radians(station1.latitude), math.radians(station1.longitude)
+    lat2, lon2 = math.radians(station2.latitude), math.radians(station2.longitude)
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
 
 class PathFinder:
     """
     Class to find the shortest path between two stations in a TubeMap.
     """
 
-    def __init__(self, tubemap):
+    # Names of the search engines that can be selected with the `engine` argument
+    ENGINES = ("dijkstra", "heap", "astar", "bidirectional", "ch", "alt", "table", "csr")
+
+    def __init__(self, tubemap, engine="dijkstra", hierarchy=None, landmarks=None, table=None,
+                 closures=None, cache_size=0, tree_cache_size=0):
+        """
+        Args:
+            tubemap (TubeMap) : The TubeMap to use.
+            engine (str) : The search engine used by get_shortest_path.
+                "dijkstra" is the original list-based implementation,
+                "heap" uses a binary heap with lazy deletion,
+                "astar" uses A* guided by station coordinates,
+                "bidirectional" searches from both ends at once,
+                "ch" queries a contraction hierarchy,
+                "alt" uses A* with landmark lower bounds,
+                "table" walks a precomputed next-hop table without searching,
+                "csr" runs a heap-based Dijkstra over the compact CSR graph.
+            hierarchy (ContractionHierarchy) : A preprocessed hierarchy for the
+                "ch" engine. If None, it is built on the first query.
+            landmarks (LandmarkTable) : Precomputed landmark tables for the
+                "alt" engine. If None, they are built on the first query.
+            table (DistanceTable) : Precomputed (possibly memory-mapped) tables
+                for the "table" engine. If None, they are built on the first query.
+                Data passed in here is never rebuilt by the PathFinder: after a
+                change to the map it no longer reflects, it is marked stale and
+                queries search the graph instead (see on_map_change).
+            closures (ClosureOverlay) : Closed stations and connections to route
+                around. If None, an empty overlay is created, available as
+                self.closures.
+            cache_size (int) : Maximum number of query results kept in an LRU
+                cache. 0 disables the cache.
+            tree_cache_size (int) : Maximum number of origins whose complete
+                shortest-path tree is kept in an LRU cache. When enabled, every
+                query is answered from the tree of its origin. 0 disables it.
+        """
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine '{engine}'. Choose one of {self.ENGINES}.")
+        self.tubemap = tubemap
+        self.engine = engine
+        self.graph_builder = NeighbourGraphBuilder(collapse_parallel=True)
+        self.graph = self.graph_builder.build(self.tubemap)
+        # Fastest connection (and its time) per pair of neighbours, see neighbour_times
+        self.min_connections = self.graph_builder.min_connections
+        self.min_times = self.graph_builder.min_times
+        # The same times by station number (tubemap.station_index), see build_adjacency
+        self.adjacency = []
+        self.build_adjacency()
+        self.csr = None         # compact graph, built lazily for the "csr" engine
+        self.max_speed = None   # km per minute, calibrated lazily for A*
+        self.max_speed_connection = None    # the connection as fast as max_speed
+        self.vectors = None     # station positions on the unit sphere, computed lazily for A*
+        self.hierarchy = hierarchy
+        self.landmarks = landmarks
+        self.table = table
+        # Precomputed data passed in by the caller, marked stale instead of rebuilt
+        self.supplied = {name for name, data in (("hierarchy", hierarchy), ("landmarks", landmarks),
+                                                 ("table", table)) if data is not None}
+        self.closures = closures if closures is not None else ClosureOverlay(tubemap)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()      # key: (start id, end id, options), value: result
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.tree_cache_size = tree_cache_size
+        self.tree_cache = OrderedDict() # key: origin id, value: (dist, prev)
+        self.cache_version = None       # (tubemap version, closures version) of cached results
+        # Keep the graph in sync with later changes to the map instead of rebuilding it.
+        # The map only holds a weak reference, so dropped PathFinders are not kept alive.
+        if hasattr(tubemap, 'subscribe'):
+            tubemap.subscribe(self.on_map_change)
+
+    def on_map_change(self, event, item):
+        """
+                Applies a change notified by the tube map (see TubeMap.listeners).
+
+                A connection added, removed or retimed only updates the entries of its
+                two stations in the graph and in the adjacency lists, so the cost is
+                proportional to their degree.
+                The closure overlay numbers new stations and connections, and cached
+                results are cleared by the version check.
+
+                Precomputed data is only invalidated when the change affects it:
+                the contraction hierarchy and the distance table when the fastest
+                time between the two stations changes, and the landmarks only when
+                it decreases (lower bounds computed with longer times stay
+                admissible). See invalidate() for what happens to invalidated data.
+                The A* maximum speed is raised by faster connections, and only
+                recalibrated when the connection that set it slows down or is
+                removed. The CSR graph is never patched: it is marked stale, and
+                the "csr" engine searches the adjacency lists until build_csr()
+                is called.
+                After import_from_json, the graph is rebuilt and everything is invalidated.
+
+                Args:
+                    event (str): The kind of change.
+                    item (Station or Connection): The changed item, or None.
+
+                Returns:
+                    None
+        """
+        if event == "map_imported":
+            self.graph = self.graph_builder.build(self.tubemap)
+            self.min_connections = self.graph_builder.min_connections
+            self.min_times = self.graph_builder.min_times
+            self.build_adjacency()
+            # Registering is idempotent, so existing closures are kept
+            self.closures.apply_change("station_added", None)
+            for connection in self.tubemap.connections:
+                self.closures.apply_change("connection_added", connection)
+            for name in ("hierarchy", "landmarks", "table"):
+                self.invalidate(name)
+            self.csr = None
+            self.max_speed = self.max_speed_connection = None
+            self.vectors = None
+        elif event == "station_added":
+            self.graph_builder.apply_change(self.graph, event, item)
+            self.closures.apply_change(event, item)
+            self.update_adjacency(item.id)
+            if self.vectors is not None:
+                number = self.tubemap.station_index[item.id]
+                if number < len(self.vectors):
+                    self.vectors[number] = self.station_vector(item)
+                else:
+                    self.vectors.append(self.station_vector(item))
+            if self.csr is not None:
+                self.csr.stale = True
+        else:
+            stationA, stationB = item.stations
+            before = self.min_times.get(stationA.id, {}).get(stationB.id, float('inf'))
+            self.graph_builder.apply_change(self.graph, event, item)
+            self.closures.apply_change(event, item)
+            self.update_adjacency(stationA.id)
+            self.update_adjacency(stationB.id)
+            after = self.min_times.get(stationA.id, {}).get(stationB.id, float('inf'))
+            if after != before:
+                self.invalidate("hierarchy")
+                self.invalidate("table")
+            if after < before:
+                self.invalidate("landmarks")
+            self.update_max_speed(event, item)
+            if self.csr is not None:
+                self.csr.stale = True
+
+    def invalidate(self, name):
+        """
+                Invalidates precomputed data after a change to the map.
+
+                Data built by the PathFinder itself is dropped and rebuilt on the next
+                query that needs it. Data passed in by the caller (for instance a
+                memory-mapped DistanceTable shared between processes) is never
+                replaced: it is marked stale, and queries fall back to the heap
+                search until the caller provides rebuilt data.
+
+                Args:
+                    name (str): "hierarchy", "landmarks" or "table".
+
+                Returns:
+                    None
+        """
+        data = getattr(self, name)
+        if data is None:
+            return
+        if name in self.supplied:
+            data.stale = True
+        else:
+            setattr(self, name, None)
+
+    def get_shortest_path(self, start_station_name, end_station_name):
+        """ Find ONE shortest path from start_station_name to end_station_name.
+        
+        The shortest path is the path that takes the least amount of time.
+
+        For instance, get_shortest_path('Stockwell', 'South Kensington') 
+        should return the list:
+        [Station(245, Stockwell, {2}), 
+         Station(272, Vauxhall, {1, 2}), 
+         Station(198, Pimlico, {1}), 
+         Station(273, Victoria, {1}), 
+         Station(229, Sloane Square, {1}), 
+         Station(236, South Kensington, {1})
+        ]
+
+        If start_station_name or end_station_name does not exist, return None.
+        
+        You can use the Dijkstra algorithm to find the shortest path from
+        start_station_name to end_station_name.
+
+        Args:
+            start_station_name (str): name of the starting station
+            end_station_name (str): name of the ending station
+
+        Returns:
+            list[Station] : list of Station objects corresponding to ONE 
+                shortest path from start_station_name to end_station_name.
+                Returns None if start_station_name or end_station_name does not 
+                exist.
+                Returns a list with one Station object (the station itself) if 
+                start_station_name and end_station_name are the same.
+        """
+        # Check if graph is empty from invalid input to .build() method
+        if self.graph == {}:
+            return None
+
+        # Name index kept by the tube map to convert station name strings to id
+        conversion_dict = self.tubemap.name_index
+
+        # Check if start or end station names are invalid
+        if start_station_name not in conversion_dict or end_station_name not in conversion_dict:
+            print('Input stations not valid. Please enter valid station names.')
+            return None
+
+        # Get station IDs from names
+
+        start_station_id = conversion_dict[start_station_name]
+        end_station_id = conversion_dict[end_station_name]
+
+        # If start and end stations are the same, return the start station instance
+        if start_station_id == end_station_id:
+            return [self.tubemap.stations[start_station_id]]
+
+        # Run the selected search engine, unless the result is cached
+        key = (start_station_id, end_station_id, self.engine)
+        return self.cached(key, lambda: self.run_engine(start_station_id, end_station_id))
+
+    def cached(self, key, compute):
+        """
+                Returns a result from the LRU cache, computing and storing it on a miss.
+
+                The cache is cleared whenever the tube map or the closures have changed
+                since the cached results were computed.
+
+                Args:
+                    key (tuple): The start ID, end ID and routing options of the query.
+                    compute (function): Called without arguments to compute the result.
+
+                Returns:
+                    The cached or computed result. Lists are copied, so callers
+                    cannot modify the cached value.
+        """
+        if self.cache_size <= 0:
+            return compute()
+
+        self.check_cache_version()
+        if key in self.cache:
+            self.cache_hits += 1
+            self.cache.move_to_end(key)
+            result = self.cache[key]
+        else:
+            self.cache_misses += 1
+            result = compute()
+            self.cache[key] = result
+            # Evict the least recently used result
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+        return list(result) if result is not None else None
+
+    def check_cache_version(self):
+        """
+                Clears the result and tree caches if the tube map or the closures have
+                changed since the cached values were computed.
+
+                Returns:
+                    None
+        """
+        version = (getattr(self.tubemap, 'version', None), self.closures.version)
+        if version != self.cache_version:
+            self.cache.clear()
+            self.tree_cache.clear()
+            self.cache_version = version
+
+    def shortest_path_tree(self, start_station_id):
+        """
+                Returns the complete shortest-path tree of an origin, from the tree cache
+                when possible.
+
+                Args:
+                    start_station_id (str): The ID of the origin station.
+
+                Returns:
+                    tuple: `dist` and `prev` lists indexed by station number, as
+                           returned by run_one_to_many for the whole graph.
+        """
+        self.check_cache_version()
+        if start_station_id in self.tree_cache:
+            self.tree_cache.move_to_end(start_station_id)
+            return self.tree_cache[start_station_id]
+
+        tree = self.run_one_to_many(start_station_id)
+        if self.tree_cache_size > 0:
+            self.tree_cache[start_station_id] = tree
+            # Evict the least recently used tree
+            if len(self.tree_cache) > self.tree_cache_size:
+                self.tree_cache.popitem(last=False)
+        return tree
+
+    def cache_info(self):
+        """
+                Returns statistics about the result cache.
+
+                Returns:
+                    dict: The number of hits, misses, cached results and the maximum size,
+                          and the number of cached trees and their maximum number.
+        """
+        return {'hits': self.cache_hits, 'misses': self.cache_misses,
+                'size': len(self.cache), 'max_size': self.cache_size,
+                'trees': len(self.tree_cache), 'max_trees': self.tree_cache_size}
+
+    def get_journey(self, start_station_name, end_station_name):
+        """ Find ONE shortest path, with the connection and line used for every hop.
+
+        The path is the one get_shortest_path returns, from the selected engine
+        and the result cache, so no extra search is run. The Connection of each
+        hop is the fastest one between its two stations, precomputed in
+        `min_connections` (see hop_connection), so the result also gives the
+        legs travelled on each line and the total time.
+
+        Args:
+            start_station_name (str): name of the starting station
+            end_station_name (str): name of the ending station
+
+        Returns:
+            Journey : the stations, connections, per-line legs and total time
+                of the path.
+                Returns None if start_station_name or end_station_name does not
+                exist, or if there is no path.
+        """
+        stations = self.get_shortest_path(start_station_name, end_station_name)
+        if stations is None:
+            return None
+
+        connections = []
+        arrival_line = None
+        for station, next_station in zip(stations, stations[1:]):
+            connection = self.hop_connection(station.id, next_station.id, arrival_line)
+            connections.append(connection)
+            arrival_line = connection.line
+        return Journey(stations, connections)
+
+    def hop_connection(self, station_id, neighbour_id, arrival_line=None):
+        """
+                Returns the connection taken between two neighbouring stations of a path.
+
+                This is the fastest open connection between them, preferring the line
+                used to arrive at station_id among equally fast ones, so that journeys
+                do not change line needlessly. Without closures and with no tie to
+                break, it is read from `min_connections` without looking at the others.
+
+                Args:
+                    station_id (str): The ID of the station the hop leaves from.
+                    neighbour_id (str): The ID of the station the hop arrives at.
+                    arrival_line (Line): The line of the previous hop, or None.
+
+                Returns:
+                    Connection: The connection used for the hop.
+        """
+        fastest = self.min_connections[station_id][neighbour_id]
+        if not self.closures.is_active() and (arrival_line is None or fastest.line is arrival_line):
+            return fastest
+        connections = self.graph[station_id][neighbour_id]
+        if self.closures.is_active():
+            connections = [connection for connection in connections
+                           if not self.closures.is_connection_closed(connection)]
+        return min(connections, key=lambda connection: (connection.time, connection.line is not arrival_line))
+
+    def get_shortest_paths(self, origins, destinations, return_times=False):
+        """ Find one shortest path from every origin to every destination.
+
+        A single search is run per distinct origin, and it stops as soon as all
+        the requested destinations are settled.
+
+        Args:
+            origins (list[str]): names of the starting stations
+            destinations (list[str]): names of the ending stations
+            return_times (bool): if True, return travel times (int) instead of
+                paths
+
+        Returns:
+            list[list] : matrix where entry [i][j] is the shortest path
+                (list[Station]) or travel time from origins[i] to destinations[j].
+                Entries are None when a station does not exist or no path exists.
+        """
+        conversion_dict = self.tubemap.name_index
+        destination_ids = [conversion_dict.get(name) for name in destinations]
+        targets = {station_id for station_id in destination_ids if station_id is not None}
+
+        # Results per distinct origin, shared by repeated origins
+        searches = {}
+        matrix = []
+        for origin in origins:
+            start_station_id = conversion_dict.get(origin)
+            if start_station_id is None:
+                matrix.append([None] * len(destinations))
+                continue
+            if start_station_id not in searches:
+                if self.tree_cache_size > 0:
+                    searches[start_station_id] = self.shortest_path_tree(start_station_id)
+                else:
+                    searches[start_station_id] = self.run_one_to_many(start_station_id, targets)
+            dist, prev = searches[start_station_id]
+
+            row = []
+            for end_station_id in destination_ids:
+                end = self.tubemap.station_index.get(end_station_id)
+                if end is None or dist[end] == float('inf'):
+                    row.append(None)
+                elif return_times:
+                    row.append(dist[end])
+                else:
+                    row.append(self.numbered_path(end, prev))
+            matrix.append(row)
+
+        return matrix
+
+    def reachable_within(self, station_names, minutes):
+        """ Find all stations reachable within a time budget (an isochrone).
+
+        For instance, reachable_within('Covent Garden', 2) first yields
+        (Station(60, Covent Garden, {1}), 0), then Holborn and Leicester Square
+        at 1 minute, then Tottenham Court Road and Chancery Lane at 2 minutes.
+
+        Args:
+            station_names (str or list[str]): name of the starting station, or
+                names of several starting stations. With several stations, the
+                arrival time is measured from the closest one.
+            minutes (int): time budget in minutes
+
+        Returns:
+            generator : yields (Station, arrival time) tuples in increasing order
+                of arrival time, for every station reachable within `minutes`.
+                Returns None if any of the station names does not exist.
+        """
+        if isinstance(station_names, str):
+            station_names = [station_names]
+
+        conversion_dict = self.tubemap.name_index
+        if any(name not in conversion_dict for name in station_names):
+            print('Input stations not valid. Please enter valid station names.')
+            return None
+
+        return self.run_bounded_dijkstra([conversion_dict[name] for name in station_names], minutes)
+
+    def run_bounded_dijkstra(self, start_station_ids, minutes):
+        """
+                Runs a multi-source Dijkstra search that stops past a time budget.
+
+                Args:
+                    start_station_ids (list[str]): The IDs of the starting stations.
+                    minutes (int): The time budget in minutes.
+
+                Yields:
+                    tuple: (Station, arrival time) in increasing order of arrival time.
+        """
+        index = self.tubemap.station_index
+        station_ids = self.tubemap.station_ids
+        dist = [float('inf')] * len(self.adjacency)
+        settled = bytearray(len(self.adjacency))
+        starts = {index[station_id] for station_id in start_station_ids}
+        for station in starts:
+            dist[station] = 0
+        heap = [(0, station) for station in starts]
+        heapq.heapify(heap)
+
+        while heap:
+            station_dist, station = heapq.heappop(heap)
+            if settled[station]:
+                continue
+            # Every station left in the heap is further away
+            if station_dist > minutes:
+                break
+            settled[station] = 1
+            yield self.tubemap.stations[station_ids[station]], station_dist
+
+            for neighbour, time in self.numbered_neighbours(station):
+                if settled[neighbour]:
+                    continue
+                alt = station_dist + time
+                if alt <= minutes and alt < dist[neighbour]:
+                    dist[neighbour] = alt
+                    heapq.heappush(heap, (alt, neighbour))
+
+    def iter_shortest_paths(self, start_station_name, end_station_name):
+        """ Find the 1st, 2nd, ... shortest loopless paths between two stations.
+
+        Paths are generated lazily with Yen's algorithm, so only the alternatives
+        actually consumed are computed. For instance, the first three alternatives
+        are obtained with itertools.islice(path_finder.iter_shortest_paths(a, b), 3).
+
+        Args:
+            start_station_name (str): name of the starting station
+            end_station_name (str): name of the ending station
+
+        Returns:
+            generator : yields lists of Station objects in increasing order of
+                travel time. Returns None if start_station_name or
+                end_station_name does not exist.
+        """
+        conversion_dict = self.tubemap.name_index
+        if start_station_name not in conversion_dict or end_station_name not in conversion_dict:
+            print('Input stations not valid. Please enter valid station names.')
+            return None
+
+        return self.run_yen(conversion_dict[start_station_name], conversion_dict[end_station_name])
+
+    def run_yen(self, start_station_id, end_station_id):
+        """
+                Runs Yen's k-shortest loopless paths algorithm as a generator.
+
+                Each new path is found by a spur search (run_heap_dijkstra) from a node
+                of the previous path, with the root prefix before that node removed
+                and the edges already used by accepted paths sharing that root excluded.
+                Following Lawler, spur searches only start from the point where a path
+                deviates from its parent, as earlier roots were already explored.
+                The cumulative time along each accepted path is cached, so the cost
+                of any root prefix is a lookup.
+
+                Args:
+                    start_station_id (str): The ID of the starting station.
+                    end_station_id (str): The ID of the ending station.
+
+                Yields:
+                    list[Station]: The next shortest loopless path.
+        """
+        if start_station_id == end_station_id:
+            if start_station_id in self.tubemap.stations:
+                yield [self.tubemap.stations[start_station_id]]
+            return
+
+        first_path = self.run_heap_dijkstra(start_station_id, end_station_id)
+        if first_path is None:
+            return
+        first_ids = [station.id for station in first_path]
+
+        # Accepted paths as (station IDs, cumulative times, deviation index)
+        accepted = [(first_ids, self.cumulative_times(first_ids), 0)]
+        seen = {tuple(first_ids)}
+        candidates = []
+        counter = 0     # Tie breaker so the heap never compares lists
+        yield first_path
+
+        while True:
+            path_ids, path_times, deviation = accepted[-1]
+
+            for i in range(deviation, len(path_ids) - 1):
+                root = path_ids[:i + 1]
+                excluded_edges = {(ids[i], ids[i + 1]) for ids, _, _ in accepted
+                                  if len(ids) > i + 1 and ids[:i + 1] == root}
+                spur_path = self.run_heap_dijkstra(path_ids[i], end_station_id,
+                                                   set(root[:-1]), excluded_edges)
+                if spur_path is None:
+                    continue
+                candidate = root[:-1] + [station.id for station in spur_path]
+                if tuple(candidate) in seen:
+                    continue
+                seen.add(tuple(candidate))
+                spur_times = self.cumulative_times(candidate[i:])
+                heapq.heappush(candidates, (path_times[i] + spur_times[-1], counter, candidate, i))
+                counter += 1
+
+            if not candidates:
+                return
+
+            _, _, path_ids, deviation = heapq.heappop(candidates)
+            accepted.append((path_ids, self.cumulative_times(path_ids), deviation))
+            yield [self.tubemap.stations[station_id] for station_id in path_ids]
+
+    def get_shortest_path_with_changes(self, start_station_name, end_station_name,
+                                       interchange_penalty=3):
+        """ Find ONE shortest path, counting the time needed to change lines.
+
+        Unlike get_shortest_path, the line each connection belongs to is taken
+        into account: every change of line along the journey adds
+        interchange_penalty minutes to the travel time.
+
+        Args:
+            start_station_name (str): name of the starting station
+            end_station_name (str): name of the ending station
+            interchange_penalty (int): minutes added for every change of line
+
+        Returns:
+            list[tuple] : list of (Station, Line) tuples along the journey, where
+                Line is the line taken to arrive at the station (None for the
+                starting station).
+                Returns None if start_station_name or end_station_name does not
+                exist, or if there is no path.
+        """
+        conversion_dict = self.tubemap.name_index
+        if start_station_name not in conversion_dict or end_station_name not in conversion_dict:
+            print('Input stations not valid. Please enter valid station names.')
+            return None
+
+        start_station_id = conversion_dict[start_station_name]
+        end_station_id = conversion_dict[end_station_name]
+        if start_station_id == end_station_id:
+            return [(self.tubemap.stations[start_station_id], None)]
+
+        key = (start_station_id, end_station_id, ('changes', interchange_penalty))
+        return self.cached(key, lambda: self.run_line_aware_dijkstra(start_station_id, end_station_id,
+                                                                     interchange_penalty))
+
+    def run_line_aware_dijkstra(self, start_station_id, end_station_id, interchange_penalty):
+        """
+                Runs Dijkstra's algorithm over (station ID, line ID) states.
+
+                The state space is never materialised: the successors of a state are
+                generated from self.graph when it is settled, one per connection, so
+                memory only grows with the states actually reached.
+
+                Args:
+                    start_station_id (str): The ID of the starting station.
+                    end_station_id (str): The ID of the ending station.
+                    interchange_penalty (int): Minutes added for every change of line.
+
+                Returns:
+                    list[tuple]: (Station, Line) tuples along the shortest journey.
+                                 If no path is found, returns None.
+        """
+        if start_station_id not in self.graph or end_station_id not in self.graph:
+            return None
+
+        # The starting state has no line yet, so the first line taken is free
+        start_state = (start_station_id, None)
+        dist = {start_state: 0}
+        prev = {start_state: None}
+        arrival_line = {start_state: None}
+        settled = set()
+        heap = [(0, start_state)]
+
+        while heap:
+            state_dist, state = heapq.heappop(heap)
+            if state in settled:
+                continue
+            settled.add(state)
+            station_id, line_id = state
+
+            # The first state reached at the end station has the best time
+            if station_id == end_station_id:
+                journey = []
+                while state is not None:
+                    journey.append((self.tubemap.stations[state[0]], arrival_line[state]))
+                    state = prev[state]
+                return journey[::-1]
+
+            for neighbour, connections in self.neighbours(station_id):
+                for connection in connections:
+                    next_state = (neighbour, connection.line.id)
+                    if next_state in settled:
+                        continue
+                    alt = state_dist + connection.time
+                    if line_id is not None and connection.line.id != line_id:
+                        alt += interchange_penalty
+                    if alt < dist.get(next_state, float('inf')):
+                        dist[next_state] = alt
+                        prev[next_state] = state
+                        arrival_line[next_state] = connection.line
+                        heapq.heappush(heap, (alt, next_state))
+
+        return None
+
+    def get_pareto_paths(self, start_station_name, end_station_name):
+        """ Find all non-dominated journeys by travel time, line changes and zones.
+
+        A journey dominates another one if it is no worse on all three criteria
+        (travel time, number of line changes, number of fare zones touched) and
+        strictly better on at least one.
+
+        Args:
+            start_station_name (str): name of the starting station
+            end_station_name (str): name of the ending station
+
+        Returns:
+            list[tuple] : (journey, time, changes, zones) tuples sorted by time,
+                where journey is a list of (Station, Line) tuples as returned by
+                get_shortest_path_with_changes and zones is the number of fare
+                zones touched.
+                Returns None if start_station_name or end_station_name does not
+                exist.
+        """
+        conversion_dict = self.tubemap.name_index
+        if start_station_name not in conversion_dict or end_station_name not in conversion_dict:
+            print('Input stations not valid. Please enter valid station names.')
+            return None
+
+        return self.run_pareto_search(conversion_dict[start_station_name], conversion_dict[end_station_name])
+
+    def run_pareto_search(self, start_station_id, end_station_id):
+        """
+                Runs a multi-criteria label-setting search over (station ID, line ID) states.
+
+                Each label stores a travel time, a number of changes and the fare zones
+                touched as a bit mask, in parallel lists indexed by label number. Labels
+                are settled in increasing time order, and a label is discarded if a label
+                already settled at the same state, or at the end station, dominates it.
+                Zones only grow along a journey, so a label with a subset of the zones
+                of another one is at least as good in every extension.
+
+                Args:
+                    start_station_id (str): The ID of the starting station.
+                    end_station_id (str): The ID of the ending station.
+
+                Returns:
+                    list[tuple]: (journey, time, changes, zones) tuples sorted by time.
+        """
+        if start_station_id not in self.graph or end_station_id not in self.graph:
+            return []
+
+        zone_masks = {}
+        for station_id, station in self.tubemap.stations.items():
+            zone_masks[station_id] = sum(1 << zone for zone in station.zones)
+
+        # Compact label storage: one entry per label in each list
+        label_time = []
+        label_changes = []
+        label_zones = []
+        label_state = []
+        label_line = []
+        label_parent = []
+
+        def add_label(time, changes, zones, state, line, parent):
+            label_time.append(time)
+            label_changes.append(changes)
+            label_zones.append(zones)
+            label_state.append(state)
+            label_line.append(line)
+            label_parent.append(parent)
+            return len(label_time) - 1
+
+        def dominated(time, changes, zones, labels):
+            return any(label_time[label] <= time and label_changes[label] <= changes
+                       and label_zones[label] & ~zones == 0 for label in labels)
+
+        start_state = (start_station_id, None)
+        start_label = add_label(0, 0, zone_masks[start_station_id], start_state, None, None)
+        heap = [(0, 0, start_label)]
+        settled = {}        # state -> settled labels at that state
+        target_labels = []  # settled labels at the end station
+
+        while heap:
+            time, changes, label = heapq.heappop(heap)
+            zones = label_zones[label]
+            state = label_state[label]
+            station_id, line_id = state
+
+            if dominated(time, changes, zones, settled.get(state, ())):
+                continue
+            if dominated(time, changes, zones, target_labels):
+                continue
+            settled.setdefault(state, []).append(label)
+
+            if station_id == end_station_id:
+                target_labels.append(label)
+                continue
+
+            for neighbour, connections in self.neighbours(station_id):
+                next_zones = zones | zone_masks[neighbour]
+                for connection in connections:
+                    next_time = time + connection.time
+                    next_changes = changes
+                    if line_id is not None and connection.line.id != line_id:
+                        next_changes += 1
+                    next_state = (neighbour, connection.line.id)
+                    if dominated(next_time, next_changes, next_zones, settled.get(next_state, ())):
+                        continue
+                    next_label = add_label(next_time, next_changes, next_zones,
+                                           next_state, connection.line, label)
+                    heapq.heappush(heap, (next_time, next_changes, next_label))
+
+        # Keep journeys that are not dominated on (time, changes, number of zones)
+        results = []
+        for label in target_labels:
+            criteria = (label_time[label], label_changes[label], bin(label_zones[label]).count('1'))
+            if any(result[1:] == criteria for result in results):
+                continue
+            other_criteria = [(label_time[other], label_changes[other], bin(label_zones[other]).count('1'))
+                              for other in target_labels]
+            if any(all(o <= c for o, c in zip(other, criteria)) and other != criteria
+                   for other in other_criteria):
+                continue
+
+            journey = []
+            while label is not None:
+                journey.append((self.tubemap.stations[label_state[label][0]], label_line[label]))
+                label = label_parent[label]
+            results.append((journey[::-1],) + criteria)
+
+        return sorted(results, key=lambda result: result[1:])
+
+    def cumulative_times(self, id_path):
+        """
+                Computes the travel time from the first station to every station of a path.
+
+                Args:
+                    id_path (list[str]): The station IDs along a path.
+
+                Returns:
+                    list[int]: Element i is the travel time from id_path[0] to id_path[i].
+        """
+        times = [0]
+        for station_id, next_station_id in zip(id_path, id_path[1:]):
+            times.append(times[-1] + dict(self.neighbour_times(station_id))[next_station_id])
+        return times
+
+    def run_engine(self, start_station_id, end_station_id):
+        """
+                Dispatches the search to the engine selected at construction time.
+
+                Args:
+                    start_station_id (str): The ID of the starting station.
+                    end_station_id (str): The ID of the ending station.
+
+                Returns:
+                    list[Station]: A list of Station objects representing the shortest path.
+                                   If no path is found, returns None.
+        """
+        if self.tree_cache_size > 0:
+            return self.run_tree_lookup(start_station_id, end_station_id)
+        if self.engine == "heap":
+            return self.run_heap_dijkstra(start_station_id, end_station_id)
+        # Precomputed engines ignore closures, so search the graph directly instead
+        if self.engine in ("ch", "table") and self.closures.is_active():
+            return self.run_heap_dijkstra(start_station_id, end_station_id)
+        # Same when the precomputed data no longer matches the map
+        precomputed = {"ch": self.hierarchy, "alt": self.landmarks, "table": self.table,
+                       "csr": self.csr}.get(self.engine)
+        if precomputed is not None and precomputed.stale:
+            return self.run_heap_dijkstra(start_station_id, end_station_id)
+        if self.engine == "astar":
+            return self.run_astar(start_station_id, end_station_id)
+        if self.engine == "bidirectional":
+            return self.run_bidirectional(start_station_id, end_station_id)
+        if self.engine == "ch":
+            return self.run_contraction_hierarchy(start_station_id, end_station_id)
+        if self.engine == "alt":
+            if self.landmarks is None:
+                self.build_landmarks()
+            return self.run_astar(start_station_id, end_station_id, self.landmarks.lower_bound)
+        if self.engine == "table":
+            return self.run_table_walk(start_station_id, end_station_id)
+        if self.engine == "csr":
+            return self.run_csr_dijkstra(start_station_id, end_station_id)
+        return self.run_dijkstra(start_station_id, end_station_id)
+
+    def run_tree_lookup(self, start_station_id, end_station_id):
+        """
+                Answers a query from the shortest-path tree of the start station.
+
+                Once the tree of an origin is cached, the path is rebuilt with
+                numbered_path in O(path length), without searching.
+
+                Args:
+                    start_station_id (str): The ID of the starting station.
+                    end_station_id (str): The ID of the ending station.
+
+                Returns:
+                    list[Station]: A list of Station objects representing the shortest path.
+                                   If no path is found, returns None.
+        """
+        index = self.tubemap.station_index
+        if start_station_id not in index or end_station_id not in index:
+            return None
+        dist, prev = self.shortest_path_tree(start_station_id)
+        end = index[end_station_id]
+        if dist[end] == float('inf'):
+            return None
+        return self.numbered_path(end, prev)
+
+    def build_adjacency(self):
+        """
+                Builds the adjacency lists used by the heap-based engines.
+
+                adjacency[number] lists (neighbour number, time of the fastest
+                connection) pairs, numbers being the dense station numbers of
+                tubemap.station_index. Searches can then keep distances and
+                predecessors in flat lists instead of dictionaries keyed by ID.
+
+                Returns:
+                    None
+        """
+        index = self.tubemap.station_index
+        self.adjacency = [[(index[neighbour], time) for neighbour, time in self.min_times.get(station_id, {}).items()]
+                          for station_id in self.tubemap.station_ids]
+
+    def update_adjacency(self, station_id):
+        """
+                Refreshes the adjacency list of one station after a change to the map.
+
+                Args:
+                    station_id (str): The ID of the station.
+
+                Returns:
+                    None
+        """
+        index = self.tubemap.station_index
+        while len(self.adjacency) < len(self.tubemap.station_ids):
+            self.adjacency.append([])
+        self.adjacency[index[station_id]] = [(index[neighbour], time) for neighbour, time
+                                             in self.min_times.get(station_id, {}).items()]
+
+    def numbered_neighbours(self, station):
+        """
+                Lists the open neighbours of a station by number.
+
+                Args:
+                    station (int): The number of the station.
+
+                Returns:
+                    list: (neighbour number, time) pairs. Read from the adjacency
+                          lists unless closures are active.
+        """
+        if not self.closures.is_active():
+            return self.adjacency[station]
+        index = self.tubemap.station_index
+        return [(index[neighbour], time)
+                for neighbour, time in self.neighbour_times(self.tubemap.station_ids[station])]
+
+    def numbered_path(self, end, prev):
+        """
+                Reconstructs a path from the flat predecessor list of a numbered search.
+
+                Args:
+                    end (int): The number of the ending station.
+                    prev (list): The predecessor number of each station, -1 for none.
+
+                Returns:
+                    list[Station]: The Station objects from the start to the end.
+        """
+        station_ids = self.tubemap.station_ids
+        path = []
+        station = end
+        while station != -1:
+            path.append(self.tubemap.stations[station_ids[station]])
+            station = prev[station]
+        return path[::-1]
+
+    def neighbours(self, station_id):
+        """
+                Lists the neighbours of a station that are open.
+
+                Args:
+                    station_id (str): The ID of the station.
+
+                Returns:
+                    iterable: (neighbour ID, list of Connections) pairs from self.graph,
+                              without closed stations and connections.
+        """
+        neighbours = self.graph.get(station_id, {})
+        # Skip filtering entirely when nothing is closed
+        if not self.closures.is_active():
+            return neighbours.items()
+        return self.closures.open_neighbours(station_id, neighbours)
+
+    def neighbour_times(self, station_id):
+        """
+                Lists the open neighbours of a station with the time of the fastest
+                open connection to each of them.
+
+                Args:
+                    station_id (str): The ID of the station.
+
+                Returns:
+                    iterable: (neighbour ID, time) pairs. Uses the times precomputed at
+                              build time unless closures are active.
+        """
+        if not self.closures.is_active():
+            return self.min_times.get(station_id, {}).items()
+        return ((neighbour, min(connection.time for connection in connections))
+                for neighbour, connections in self.neighbours(station_id))
+
+    def run_dijkstra(self, start_station_id, end_station_id):
+        """
+                Runs Dijkstra's algorithm to compute the shortest path between two stations by ID.
+
+                Args:
+                    start_station_id (int): The ID of the starting station.
+                    end_station_id (int): The ID of the ending station.
+
+                Returns:
+                    list[Station]: A list of Station objects representing the shortest path.
+                                   If no path is found, returns None.
+        """
+
+        dist, prev, queue = self.initialise_data_structures(start_station_id)
+
+        # While queue is not empty
+        while len(queue) != 0:
+
+            # Get node with min distance in queue
+            station_id = min(queue, key=lambda k: dist[k])
+
+            # Check if goal is reached
+            if station_id == end_station_id:
+                break
+
+            # Remove station_id from queue
+            queue.remove(station_id)
+
+            # Explore neighbours and find min distance.
+            neighbours = dict(self.neighbours(station_id))
+
+            # Find valid neighbours
+            valid_neighbours = {neighbour: value for neighbour, value in neighbours.items() if neighbour in queue}
+
+            # Update neighbour distance if necessary
+            dist, prev = self.update_neighbour_distances(valid_neighbours, dist, station_id, prev)
+
+        # End station is not reachable from start station (for instance due to closures)
+        if dist.get(end_station_id, float('inf')) == float('inf'):
+            return None
+
+        # Reconstruct the shortest path
+        return self.reconstruct_path(end_station_id, prev)
+
+    def run_heap_dijkstra(self, start_station_id, end_station_id,
+                          excluded_stations=None, excluded_edges=None):
+        """
+                Runs Dijkstra's algorithm using a binary heap as the priority queue.
+
+                Instead of decreasing keys, a new (distance, station number) entry is
+                pushed every time a shorter distance is found. Outdated entries are
+                skipped when popped (lazy deletion) by checking the settled stations.
+                This runs in O(E log V) instead of O(V^2). Stations are handled by
+                number, with flat lists for distances and predecessors.
+
+                Args:
+                    start_station_id (str): The ID of the starting station.
+                    end_station_id (str): The ID of the ending station.
+                    excluded_stations (set[str]): IDs of stations the path may not visit.
+                    excluded_edges (set[tuple]): (from ID, to ID) pairs the path may not use.
+
+                Returns:
+                    list[Station]: A list of Station objects representing the shortest path.
+                                   If no path is found, returns None.
+        """
+        index = self.tubemap.station_index
+        if start_station_id not in index or end_station_id not in index:
+            return None
+        start, end = index[start_station_id], index[end_station_id]
+
+        dist = [float('inf')] * len(self.adjacency)
+        prev = [-1] * len(self.adjacency)
+        settled = bytearray(len(self.adjacency))
+        # Excluded stations are treated as already settled, so they are never reached
+        for station_id in excluded_stations or ():
+            settled[index[station_id]] = 1
+        excluded_edges = {(index[station_id], index[neighbour]) for station_id, neighbour in excluded_edges} \
+            if excluded_edges else None
+        dist[start] = 0
+        heap = [(0, start)]
+
+        while heap:
+            station_dist, station = heapq.heappop(heap)
+
+            # Skip outdated heap entries for stations already settled
+            if settled[station]:
+                continue
+            settled[station] = 1
+
+            # Check if goal is reached
+            if station == end:
+                return self.numbered_path(end, prev)
+
+            for neighbour, time in self.numbered_neighbours(station):
+                if settled[neighbour]:
+                    continue
+                if excluded_edges and (station, neighbour) in excluded_edges:
+                    continue
+                alt = station_dist + time
+                if alt < dist[neighbour]:
+                    dist[neighbour] = alt
+                    prev[neighbour] = station
+                    heapq.heappush(heap, (alt, neighbour))
+
+        # End station is not reachable from start station
+        return None
+
+    def run_one_to_many(self, start_station_id, targets=None):
+        """
+                Runs a heap-based Dijkstra search from one station towards many stations.
+
+                Args:
+                    start_station_id (str): The ID of the starting station.
+                    targets (set[str]): IDs of the stations of interest. The search
+                        stops once all of them are settled. If None, the whole graph
+                        is searched.
+
+                Returns:
+                    tuple: `dist` and `prev` lists indexed by station number
+                           (tubemap.station_index), inf and -1 for stations not
+                           reached. Every target reachable from the start has its
+                           final distance in `dist`.
+        """
+        index = self.tubemap.station_index
+        start = index[start_station_id]
+        dist = [float('inf')] * len(self.adjacency)
+        prev = [-1] * len(self.adjacency)
+        settled = bytearray(len(self.adjacency))
+        dist[start] = 0
+        heap = [(0, start)]
+        remaining = {index[station_id] for station_id in targets} if targets is not None else None
+
+        while heap:
+            station_dist, station = heapq.heappop(heap)
+
+            # Skip outdated heap entries for stations already settled
+            if settled[station]:
+                continue
+            settled[station] = 1
+
+            # Stop early once every target is settled
+            if remaining is not None:
+                remaining.discard(station)
+                if not remaining:
+                    break
+
+            for neighbour, time in self.numbered_neighbours(station):
+                if settled[neighbour]:
+                    continue
+                alt = station_dist + time
+                if alt < dist[neighbour]:
+                    dist[neighbour] = alt
+                    prev[neighbour] = station
+                    heapq.heappush(heap, (alt, neighbour))
+
+        return dist, prev
+
+    def connection_speed(self, connection):
+        """
+                Computes the speed of a connection: the great-circle distance between its
+                two stations divided by Connection.time.
+
+                Args:
+                    connection (Connection): The connection.
+
+                Returns:
+                    float: The speed in km per minute. Infinity if the connection covers
+                           a positive distance in no time.
+        """
+        stationA, stationB = connection.stations
+        distance = great_circle_distance(stationA, stationB)
+        if connection.time <= 0:
+            return float('inf') if distance > 0 else 0.0
+        return distance / connection.time
+
+    def calibrate_max_speed(self):
+        """
+                Computes the maximum speed observed over all connections of the tube map.
+
+                No journey can be faster than this, which makes great-circle
+                distance / max speed an admissible heuristic.
+
+                Returns:
+                    tuple: (max speed, connection). The maximum speed in km per minute,
+                           infinity if a connection covers a positive distance in no
+                           time (which disables the heuristic), and the connection
+                           reaching it (None without connections).
+        """
+        max_speed, fastest = 0.0, None
+        for connection in self.tubemap.connections:
+            speed = self.connection_speed(connection)
+            if speed > max_speed:
+                max_speed, fastest = speed, connection
+                if speed == float('inf'):
+                    break
+        return max_speed, fastest
+
+    def update_max_speed(self, event, connection):
+        """
+                Keeps the A* maximum speed valid after a connection changed.
+
+                A faster connection raises it in O(1). If the connection that set it is
+                removed or slowed down, it is recalibrated on the next A* query.
+
+                Args:
+                    event (str): "connection_added", "connection_removed" or
+                                 "connection_time_changed".
+                    connection (Connection): The changed connection.
+
+                Returns:
+                    None
+        """
+        if self.max_speed is None:
+            return
+        speed = 0.0 if event == "connection_removed" else self.connection_speed(connection)
+        if speed > self.max_speed or (speed == self.max_speed and connection is self.max_speed_connection):
+            self.max_speed, self.max_speed_connection = speed, connection
+        elif connection is self.max_speed_connection:
+            self.max_speed = self.max_speed_connection = None
+
+    def heuristic(self, station_id, end_station_id):
+        """
+                Lower bound on the travel time (in minutes) between two stations.
+
+                Args:
+                    station_id (str): The ID of the current station.
+                    end_station_id (str): The ID of the ending station.
+
+                Returns:
+                    float: Straight-line distance divided by the maximum observed speed.
+        """
+        index = self.tubemap.station_index
+        vectors, end_vector, scale = self.geo_bounds(index[end_station_id])
+        return scale * math.dist(vectors[index[station_id]] or end_vector, end_vector)
+
+    def geo_bounds(self, end):
+        """
+                Prepares the heuristic towards one end station, for the A* engine.
+
+                The straight-line (chord) distance through the Earth is used instead of
+                the great-circle distance. It is never longer, so divided by the maximum
+                speed (calibrated on great-circle distances) it is still a lower bound,
+                and it only needs the unit vectors of the stations, computed once per
+                tube map (see station_vectors), instead of trigonometry on every call.
+
+                Args:
+                    end (int): The number of the ending station.
+
+                Returns:
+                    tuple: (vectors, end vector, scale). The bound from station number
+                           i is scale * math.dist(vectors[i] or end vector, end vector),
+                           which is 0 for stations without coordinates.
+        """
+        if self.max_speed is None:
+            self.max_speed, self.max_speed_connection = self.calibrate_max_speed()
+        if self.vectors is None or len(self.vectors) != len(self.tubemap.station_ids):
+            self.vectors = self.station_vectors()
+        if self.max_speed in (0, float('inf')) or self.vectors[end] is None:
+            return self.vectors, (0.0, 0.0, 0.0), 0.0
+        return self.vectors, self.vectors[end], EARTH_RADIUS_KM / self.max_speed
+
+    def station_vectors(self):
+        """
+                Computes the position of every station on the unit sphere.
+
+                Returns:
+                    list: An (x, y, z) tuple per station number, or None for a station
+                          without coordinates.
+        """
+        return [self.station_vector(self.tubemap.stations[station_id])
+                for station_id in self.tubemap.station_ids]
+
+    def station_vector(self, station):
+        """
+                Computes the position of a station on the unit sphere.
+
+                Args:
+                    station (Station): The station.
+
+                Returns:
+                    tuple: (x, y, z), or None if the station has no coordinates.
+        """
+        if station.latitude is None or station.longitude is None:
+            return None
+        latitude, longitude = math.radians(station.latitude), math.radians(station.longitude)
+        return (math.cos(latitude) * math.cos(longitude),
+                math.cos(latitude) * math.sin(longitude),
+                math.sin(latitude))
+
+    def build_landmarks(self, num_landmarks=8):
+        """
+                Chooses landmarks and precomputes their distances for the "alt" engine.
+
+                Args:
+                    num_landmarks (int): The number of landmarks to choose.
+
+                Returns:
+                    LandmarkTable: The landmark tables, also stored in self.landmarks.
         """
-        Args:
-            tubemap (TubeMap) : The TubeMap to use.
+        self.landmarks = LandmarkTable().build(self.graph, num_landmarks)
+        return self.landmarks
+
+    def run_astar(self, start_station_id, end_station_id, heuristic=None):
         """
-        self.tubemap = tubemap
-        graph_builder = NeighbourGraphBuilder()
-        self.graph = graph_builder.build(self.tubemap)
+                Runs A* search between two stations by ID.
 
-    def get_shortest_path(self, start_station_name, end_station_name):
-        """ Find ONE shortest path from start_station_name to end_station_name.
-        
-        The shortest path is the path that takes the least amount of time.
+                Works like run_heap_dijkstra, but stations are ordered in the heap by
+                their distance from the start plus the heuristic lower bound to the end,
+                so the search is directed towards the end station and settles fewer nodes.
+                The heuristic is computed at most once per station and query.
 
-        For instance, get_shortest_path('Stockwell', 'South Kensington') 
-        should return the list:
-        [Station(245, Stockwell, {2}), 
-         Station(272, Vauxhall, {1, 2}), 
-         Station(198, Pimlico, {1}), 
-         Station(273, Victoria, {1}), 
-         Station(229, Sloane Square, {1}), 
-         Station(236, South Kensington, {1})
-        ]
+                Args:
+                    start_station_id (str): The ID of the starting station.
+                    end_station_id (str): The ID of the ending station.
+                    heuristic (function): Lower bound on the travel time, called as
+                        heuristic(station_id, end_station_id). Defaults to the
+                        straight-line bound of geo_bounds, computed inline.
 
-        If start_station_name or end_station_name does not exist, return None.
-        
-        You can use the Dijkstra algorithm to find the shortest path from
-        start_station_name to end_station_name.
+                Returns:
+                    list[Station]: A list of Station objects representing the shortest path.
+                                   If no path is found, returns None.
+        """
+        index = self.tubemap.station_index
+        if start_station_id not in index or end_station_id not in index:
+            return None
+        station_ids = self.tubemap.station_ids
+        start, end = index[start_station_id], index[end_station_id]
+        vectors, end_vector, scale = self.geo_bounds(end)
+        # Without closures, read the adjacency lists directly
+        adjacency = self.adjacency if not self.closures.is_active() else None
 
-        Args:
-            start_station_name (str): name of the starting station
-            end_station_name (str): name of the ending station
+        dist = [float('inf')] * len(self.adjacency)
+        prev = [-1] * len(self.adjacency)
+        settled = bytearray(len(self.adjacency))
+        # Heuristic value of each station, -1 until computed
+        estimates = [-1.0] * len(self.adjacency)
+        dist[start] = 0
+        heap = [(0, start)]
 
-        Returns:
-            list[Station] : list of Station objects corresponding to ONE 
-                shortest path from start_station_name to end_station_name.
-                Returns None if start_station_name or end_station_name does not 
-                exist.
-                Returns a list with one Station object (the station itself) if 
-                start_station_name and end_station_name are the same.
+        while heap:
+            _, station = heapq.heappop(heap)
+
+            # Skip outdated heap entries for stations already settled
+            if settled[station]:
+                continue
+            settled[station] = 1
+
+            # Check if goal is reached
+            if station == end:
+                return self.numbered_path(end, prev)
+
+            for neighbour, time in adjacency[station] if adjacency else self.numbered_neighbours(station):
+                if settled[neighbour]:
+                    continue
+                alt = dist[station] + time
+                if alt < dist[neighbour]:
+                    dist[neighbour] = alt
+                    prev[neighbour] = station
+                    if estimates[neighbour] < 0:
+                        if heuristic is None:
+                            estimates[neighbour] = scale * math.dist(vectors[neighbour] or end_vector, end_vector)
+                        else:
+                            estimates[neighbour] = heuristic(station_ids[neighbour], end_station_id)
+                    heapq.heappush(heap, (alt + estimates[neighbour], neighbour))
+
+        # End station is not reachable from start station
+        return None
+
+    def run_bidirectional(self, start_station_id, end_station_id):
         """
-        # Check if graph is empty from invalid input to .build() method
-        if self.graph == {}:
+                Runs a bidirectional Dijkstra search between two stations by ID.
+
+                A forward search from the start and a backward search from the end
+                are advanced alternately, always expanding the frontier with the smaller
+                minimum key. The best meeting distance `mu` is updated whenever an edge
+                joins the two searches. The search stops as soon as the sum of the two
+                frontier minimums is at least `mu`, at which point no shorter path exists.
+                Since the tube graph is undirected, both searches use the same
+                adjacency lists.
+
+                Args:
+                    start_station_id (str): The ID of the starting station.
+                    end_station_id (str): The ID of the ending station.
+
+                Returns:
+                    list[Station]: A list of Station objects representing the shortest path.
+                                   If no path is found, returns None.
+        """
+        index = self.tubemap.station_index
+        if start_station_id not in index or end_station_id not in index:
             return None
+        if start_station_id == end_station_id:
+            return [self.tubemap.stations[start_station_id]]
+        start, end = index[start_station_id], index[end_station_id]
 
-        # Invert tubemap.stations dictionary to then convert station name strings to id
-        conversion_dict = {value.name: key for key, value in self.tubemap.stations.items()}
+        # Index 0 is the forward search, index 1 the backward search
+        dist = ([float('inf')] * len(self.adjacency), [float('inf')] * len(self.adjacency))
+        prev = ([-1] * len(self.adjacency), [-1] * len(self.adjacency))
+        settled = (bytearray(len(self.adjacency)), bytearray(len(self.adjacency)))
+        dist[0][start] = 0
+        dist[1][end] = 0
+        heaps = ([(0, start)], [(0, end)])
 
-        # Check if start or end station names are invalid
-        if start_station_name not in conversion_dict or end_station_name not in conversion_dict:
-            print('Input stations not valid. Please enter valid station names.')
+        mu = float('inf')
+        meeting_station = -1
+
+        while heaps[0] and heaps[1]:
+            # Stopping criterion
+            if heaps[0][0][0] + heaps[1][0][0] >= mu:
+                break
+
+            # Expand the side with the smaller frontier
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            other = 1 - side
+
+            station_dist, station = heapq.heappop(heaps[side])
+            if settled[side][station]:
+                continue
+            settled[side][station] = 1
+
+            for neighbour, time in self.numbered_neighbours(station):
+                alt = station_dist + time
+                if alt < dist[side][neighbour]:
+                    dist[side][neighbour] = alt
+                    prev[side][neighbour] = station
+                    heapq.heappush(heaps[side], (alt, neighbour))
+                # Check whether this edge joins the two searches with a shorter path
+                if alt + dist[other][neighbour] < mu:
+                    mu = alt + dist[other][neighbour]
+                    meeting_station = neighbour
+
+        if meeting_station == -1:
             return None
 
-        # Get station IDs from names
+        # Forward half: start -> meeting station
+        path = self.numbered_path(meeting_station, prev[0])
+        # Backward half: meeting station -> end, following the backward predecessors
+        station = prev[1][meeting_station]
+        while station != -1:
+            path.append(self.tubemap.stations[self.tubemap.station_ids[station]])
+            station = prev[1][station]
+        return path
 
-        start_station_id = conversion_dict[start_station_name]
-        end_station_id = conversion_dict[end_station_name]
+    def build_hierarchy(self):
+        """
+                Preprocesses the graph into a contraction hierarchy for the "ch" engine.
 
-        # If start and end stations are the same, return the start station instance
-        if start_station_id == end_station_id:
-            return [self.tubemap.stations[start_station_id]]
+                Returns:
+                    ContractionHierarchy: The hierarchy, also stored in self.hierarchy.
+        """
+        self.hierarchy = ContractionHierarchy().build(self.graph)
+        return self.hierarchy
 
-        # Dijkstra's Algorithm
-        return self.run_dijkstra(start_station_id, end_station_id)
+    def run_contraction_hierarchy(self, start_station_id, end_station_id):
+        """
+                Answers a shortest path query using the contraction hierarchy.
 
-    def run_dijkstra(self, start_station_id, end_station_id):
+                Args:
+                    start_station_id (str): The ID of the starting station.
+                    end_station_id (str): The ID of the ending station.
+
+                Returns:
+                    list[Station]: A list of Station objects representing the shortest path.
+                                   If no path is found, returns None.
         """
-                Runs Dijkstra's algorithm to compute the shortest path between two stations by ID.
+        if self.hierarchy is None:
+            self.build_hierarchy()
+        id_path = self.hierarchy.query(start_station_id, end_station_id)
+        if id_path is None:
+            return None
+        return [self.tubemap.stations[station_id] for station_id in id_path]
+
+    def all_pairs_times(self):
+        """
+                Computes the minimum travel time between every pair of stations.
+
+                Uses a vectorized Floyd-Warshall over a NumPy matrix instead of one
+                search per pair. NumPy is only imported when this method is called.
+
+                Returns:
+                    tuple: (station_ids, times) as returned by network.matrix.all_pairs_times.
+        """
+        from network.matrix import all_pairs_times
+        return all_pairs_times(self.tubemap)
+
+    def run_table_walk(self, start_station_id, end_station_id):
+        """
+                Answers a shortest path query by walking the next-hop table.
 
                 Args:
-                    start_station_id (int): The ID of the starting station.
-                    end_station_id (int): The ID of the ending station.
+                    start_station_id (str): The ID of the starting station.
+                    end_station_id (str): The ID of the ending station.
 
                 Returns:
                     list[Station]: A list of Station objects representing the shortest path.
                                    If no path is found, returns None.
         """
+        if self.table is None:
+            from network.matrix import DistanceTable
+            self.table = DistanceTable().build(self.tubemap)
+        id_path = self.table.path(start_station_id, end_station_id)
+        if id_path is None:
+            return None
+        return [self.tubemap.stations[station_id] for station_id in id_path]
 
-        dist, prev, queue = self.initialise_data_structures(start_station_id)
+    def build_csr(self):
+        """
+                Builds the compact CSR graph for the "csr" engine.
 
-        # While queue is not empty
-        while len(queue) != 0:
+                The graph is a snapshot of the tube map: after a change it is marked
+                stale and the engine searches the adjacency lists instead, until this
+                is called again.
 
-            # Get node with min distance in queue
-            station_id = min(queue, key=lambda k: dist[k])
+                Returns:
+                    CSRGraph: The graph, also stored in self.csr.
+        """
+        self.csr = NeighbourGraphBuilder().build_csr(self.tubemap)
+        return self.csr
 
-            # Check if goal is reached
-            if station_id == end_station_id:
-                break
+    def run_csr_dijkstra(self, start_station_id, end_station_id):
+        """
+                Runs a heap-based Dijkstra search over the CSR graph.
 
-            # Remove station_id from queue
-            queue.remove(station_id)
+                Distances and predecessors are flat lists indexed by station number
+                instead of dictionaries keyed by station ID, and edges are read from
+                contiguous arrays.
 
-            # Explore neighbours and find min distance.
-            neighbours = self.graph[station_id]
+                Args:
+                    start_station_id (str): The ID of the starting station.
+                    end_station_id (str): The ID of the ending station.
 
-            # Find valid neighbours
-            valid_neighbours = {neighbour: value for neighbour, value in neighbours.items() if neighbour in queue}
+                Returns:
+                    list[Station]: A list of Station objects representing the shortest path.
+                                   If no path is found, returns None.
+        """
+        if self.csr is None:
+            self.build_csr()
+        csr = self.csr
+        if start_station_id not in csr.index or end_station_id not in csr.index:
+            return None
+        # Closures are keyed by station ID, so let the dictionary-based search handle them
+        if self.closures.is_active():
+            return self.run_heap_dijkstra(start_station_id, end_station_id)
 
-            # Update neighbour distance if necessary
-            dist, prev = self.update_neighbour_distances(valid_neighbours, dist, station_id, prev)
+        start, end = csr.index[start_station_id], csr.index[end_station_id]
+        offsets, targets, weights = csr.offsets, csr.targets, csr.weights
+        dist = [float('inf')] * len(csr.station_ids)
+        prev = [-1] * len(csr.station_ids)
+        dist[start] = 0
+        heap = [(0, start)]
 
-        # Reconstruct the shortest path
-        return self.reconstruct_path(end_station_id, prev)
+        while heap:
+            station_dist, station = heapq.heappop(heap)
+            # Skip outdated heap entries
+            if station_dist > dist[station]:
+                continue
+            if station == end:
+                break
+            for edge in range(offsets[station], offsets[station + 1]):
+                alt = station_dist + weights[edge]
+                target = targets[edge]
+                if alt < dist[target]:
+                    dist[target] = alt
+                    prev[target] = station
+                    heapq.heappush(heap, (alt, target))
+
+        if dist[end] == float('inf'):
+            return None
+
+        path = []
+        station = end
+        while station != -1:
+            path.append(self.tubemap.stations[csr.station_ids[station]])
+            station = prev[station]
+        return path[::-1]
 
     def update_neighbour_distances(self, valid_neighbours, dist, station_id, prev):
         """
@@ -201,6 +1670,410 @@ def test_shortest_path():
     assert station_names == expected
 
 
+def test_astar():
+    """
+        Checks that A* finds paths as short as Dijkstra's with an admissible heuristic.
+    """
+    from tube.map import TubeMap
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    astar = PathFinder(tubemap, engine="astar")
+    heap = PathFinder(tubemap, engine="heap")
+    for start, end in [("Stockwell", "South Kensington"), ("Ealing Broadway", "Upminster"),
+                       ("Brixton", "Walthamstow Central")]:
+        journey = astar.get_journey(start, end)
+        assert journey.total_time == heap.get_journey(start, end).total_time
+        assert astar.heuristic(tubemap.get_station_id(start), tubemap.get_station_id(end)) <= journey.total_time
+
+
+def test_journey():
+    """
+        Checks that journeys reuse the cached path and group hops into legs.
+    """
+    from tube.map import TubeMap
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    path_finder = PathFinder(tubemap, engine="heap", cache_size=8)
+    stations = path_finder.get_shortest_path("Stockwell", "South Kensington")
+    journey = path_finder.get_journey("Stockwell", "South Kensington")
+    assert path_finder.cache_info()['hits'] == 1
+    assert journey.stations == stations
+    # Victoria line to Victoria, then District or Circle line (equally fast)
+    assert len(journey.legs) == 2 and journey.legs[0].line.name == "Victoria Line"
+    assert journey.total_time == sum(leg.time for leg in journey.legs)
+    assert journey.changes() == 1
+
+
+def test_incremental_update():
+    """
+        Checks that removing and adding back a connection updates the graph in place.
+    """
+    from tube.map import TubeMap
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    path_finder = PathFinder(tubemap, engine="heap")
+    before = path_finder.get_journey("Covent Garden", "Green Park")
+
+    connection = before.connections[0]
+    tubemap.remove_connection(connection)
+    detour = path_finder.get_journey("Covent Garden", "Green Park")
+    assert connection not in detour.connections
+    assert detour.total_time > before.total_time
+
+    tubemap.add_connection(connection)
+    after = path_finder.get_journey("Covent Garden", "Green Park")
+    assert after.total_time == before.total_time
+    # The numbered adjacency lists match a fresh build
+    rebuilt = PathFinder(tubemap)
+    assert [sorted(edges) for edges in path_finder.adjacency] == [sorted(edges) for edges in rebuilt.adjacency]
+
+
+def test_isolated_station():
+    """
+        Checks that a station left without connections is unreachable, not an error.
+    """
+    from tube.map import TubeMap
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    path_finder = PathFinder(tubemap)
+    upminster = tubemap.stations[tubemap.get_station_id("Upminster")]
+    for connection in [connection for connection in tubemap.connections
+                       if upminster in connection.stations]:
+        tubemap.remove_connection(connection)
+
+    assert path_finder.get_shortest_path("Ealing Broadway", "Upminster") is None
+    assert path_finder.get_shortest_path("Upminster", "Ealing Broadway") is None
+
+
+def test_precomputed_after_change():
+    """
+        Checks that precomputed data is only invalidated by changes that affect it,
+        and that data passed in by the caller is marked stale rather than replaced.
+    """
+    from tube.map import TubeMap
+    from network.matrix import DistanceTable
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    table = DistanceTable().build(tubemap)
+    table_finder = PathFinder(tubemap, engine="table", table=table)
+    alt_finder = PathFinder(tubemap, engine="alt")
+    reference = PathFinder(tubemap, engine="heap")
+    alt_finder.get_shortest_path("Covent Garden", "Green Park")
+    landmarks = alt_finder.landmarks
+
+    # Slower times keep the landmark bounds admissible
+    connection = reference.get_journey("Covent Garden", "Green Park").connections[0]
+    tubemap.set_connection_time(connection, connection.time + 5)
+    assert alt_finder.landmarks is landmarks
+    assert table_finder.table is table and table.stale
+    for finder in (table_finder, alt_finder):
+        journey = finder.get_journey("Covent Garden", "Green Park")
+        assert journey.total_time == reference.get_journey("Covent Garden", "Green Park").total_time
+
+    # Faster times invalidate the landmarks, rebuilt on the next query
+    tubemap.set_connection_time(connection, connection.time - 5)
+    assert alt_finder.landmarks is None
+    alt_finder.get_shortest_path("Covent Garden", "Green Park")
+    assert alt_finder.landmarks is not None
+
+    # The caller can provide rebuilt data
+    table.build(tubemap)
+    assert not table.stale
+
+
+def test_listeners_released():
+    """
+        Checks that the tube map does not keep discarded PathFinders alive.
+    """
+    import gc
+    from tube.map import TubeMap
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    path_finders = [PathFinder(tubemap) for _ in range(5)]
+    assert len(tubemap.listeners) == 5
+
+    del path_finders
+    gc.collect()
+    connection = tubemap.connections[0]
+    tubemap.set_connection_time(connection, connection.time)  # notifying drops dead listeners
+    assert tubemap.listeners == []
+
+
+def test_yen():
+    """
+        Checks that alternative paths come out loopless, distinct and by increasing time.
+    """
+    from itertools import islice
+    from tube.map import TubeMap
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    path_finder = PathFinder(tubemap, engine="heap")
+    paths = list(islice(path_finder.iter_shortest_paths("Covent Garden", "Green Park"), 5))
+    assert len(paths) == 5
+    assert paths[0] == path_finder.get_shortest_path("Covent Garden", "Green Park")
+
+    id_paths = [[station.id for station in path] for path in paths]
+    times = [path_finder.cumulative_times(id_path)[-1] for id_path in id_paths]
+    assert times == sorted(times)
+    assert len({tuple(id_path) for id_path in id_paths}) == len(id_paths)
+    for id_path in id_paths:
+        assert len(set(id_path)) == len(id_path)
+        assert id_path[0] == tubemap.get_station_id("Covent Garden")
+        assert id_path[-1] == tubemap.get_station_id("Green Park")
+
+
+def test_pareto():
+    """
+        Checks that no Pareto journey is dominated and that their criteria match the journeys.
+    """
+    from tube.map import TubeMap
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    path_finder = PathFinder(tubemap, engine="heap")
+    results = path_finder.get_pareto_paths("Ealing Broadway", "Upminster")
+    assert len(results) > 1
+    # The fastest journey is as fast as the shortest path
+    assert results[0][1] == path_finder.get_journey("Ealing Broadway", "Upminster").total_time
+
+    criteria = [result[1:] for result in results]
+    for a in criteria:
+        for b in criteria:
+            assert not (a != b and all(x <= y for x, y in zip(a, b))), f"{a} dominates {b}"
+
+    for journey, time, changes, zones in results:
+        lines = [line for _, line in journey[1:]]
+        assert changes == sum(line is not next_line for line, next_line in zip(lines, lines[1:]))
+        assert time == sum(min(connection.time for connection in path_finder.graph[station.id][next_station.id]
+                               if connection.line is line)
+                           for (station, _), (next_station, line) in zip(journey, journey[1:]))
+        assert zones == len(set().union(*(station.zones for station, _ in journey)))
+
+
+def test_result_cache():
+    """
+        Checks cache hits and misses, LRU eviction, and invalidation after changes.
+    """
+    from tube.map import TubeMap
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    path_finder = PathFinder(tubemap, engine="heap", cache_size=2)
+    first = path_finder.get_shortest_path("Covent Garden", "Green Park")
+    first.pop()     # callers get a copy of the cached path
+    assert path_finder.get_shortest_path("Covent Garden", "Green Park")[-1].name == "Green Park"
+    path_finder.get_shortest_path("Stockwell", "Brixton")
+    info = path_finder.cache_info()
+    assert (info['hits'], info['misses'], info['size']) == (1, 2, 2)
+
+    # The least recently used result is evicted
+    path_finder.get_shortest_path("Stockwell", "South Kensington")
+    path_finder.get_shortest_path("Covent Garden", "Green Park")
+    info = path_finder.cache_info()
+    assert (info['hits'], info['misses'], info['size']) == (1, 4, 2)
+
+    # Changes to the map or the closures clear the cache
+    before = path_finder.get_journey("Covent Garden", "Green Park")
+    connection = before.connections[0]
+    tubemap.set_connection_time(connection, connection.time + 10)
+    assert path_finder.get_journey("Covent Garden", "Green Park").total_time > before.total_time
+    assert path_finder.cache_info()['size'] == 1
+    tubemap.set_connection_time(connection, connection.time - 10)
+    path_finder.get_shortest_path("Covent Garden", "Green Park")
+    path_finder.closures.close_station(tubemap.get_station_id("Leicester Square"))
+    detour = path_finder.get_shortest_path("Covent Garden", "Green Park")
+    assert "Leicester Square" not in [station.name for station in detour]
+
+
+def test_tree_cache():
+    """
+        Checks that queries from the same origin reuse its cached shortest-path tree.
+    """
+    from tube.map import TubeMap
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    path_finder = PathFinder(tubemap, engine="heap", tree_cache_size=2)
+    reference = PathFinder(tubemap, engine="heap")
+    for end in ("Green Park", "Upminster", "Brixton", "Richmond"):
+        assert path_finder.get_journey("Covent Garden", end).total_time == \
+            reference.get_journey("Covent Garden", end).total_time
+    origin = tubemap.get_station_id("Covent Garden")
+    tree = path_finder.tree_cache[origin]
+    assert path_finder.cache_info()['trees'] == 1
+    assert path_finder.shortest_path_tree(origin) is tree
+
+    # The least recently used origin is evicted
+    path_finder.get_shortest_path("Stockwell", "Brixton")
+    path_finder.get_shortest_path("Upminster", "Brixton")
+    assert path_finder.cache_info()['trees'] == 2 and origin not in path_finder.tree_cache
+
+    # A change to the map drops the cached trees
+    connection = tubemap.connections[0]
+    tubemap.set_connection_time(connection, connection.time + 1)
+    path_finder.get_shortest_path("Covent Garden", "Green Park")
+    assert path_finder.cache_info()['trees'] == 1
+
+
+def test_bidirectional():
+    """
+        Checks that the bidirectional search finds paths as short as Dijkstra's.
+    """
+    from tube.map import TubeMap
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    bidirectional = PathFinder(tubemap, engine="bidirectional")
+    heap = PathFinder(tubemap, engine="heap")
+    for start, end in [("Upminster", "Ealing Broadway"), ("Ealing Broadway", "Upminster"),
+                       ("Covent Garden", "Green Park"), ("Stockwell", "South Kensington"),
+                       ("Brixton", "Walthamstow Central"), ("Richmond", "Stratford"),
+                       ("Holborn", "Chancery Lane")]:
+        journey = bidirectional.get_journey(start, end)
+        assert journey.stations[0].name == start and journey.stations[-1].name == end
+        assert journey.total_time == heap.get_journey(start, end).total_time, (start, end)
+
+
+def test_shortest_paths():
+    """
+        Checks the origin-destination matrix against single queries.
+    """
+    from tube.map import TubeMap
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    path_finder = PathFinder(tubemap, engine="heap")
+    origins = ["Covent Garden", "Nowhere", "Stockwell", "Covent Garden"]
+    destinations = ["Green Park", "Upminster", "Nowhere", "Stockwell"]
+    times = path_finder.get_shortest_paths(origins, destinations, return_times=True)
+    paths = path_finder.get_shortest_paths(origins, destinations)
+
+    # Unknown origins give a row of None, unknown destinations a column of None
+    assert times[1] == [None] * 4 and paths[1] == [None] * 4
+    assert [row[2] for row in times] == [None] * 4
+    # Repeated origins give the same row
+    assert times[0] == times[3] and paths[0] == paths[3]
+    # An origin equal to a destination
+    assert times[2][3] == 0 and paths[2][3] == [tubemap.stations[tubemap.get_station_id("Stockwell")]]
+
+    for i in (0, 2):
+        for j in (0, 1, 3):
+            if origins[i] == destinations[j]:
+                continue
+            assert times[i][j] == path_finder.get_journey(origins[i], destinations[j]).total_time
+            assert paths[i][j][0].name == origins[i] and paths[i][j][-1].name == destinations[j]
+            assert path_finder.cumulative_times([station.id for station in paths[i][j]])[-1] == times[i][j]
+
+
+def test_reachable_within():
+    """
+        Checks the stations reachable within a time budget, from one or several origins.
+    """
+    from tube.map import TubeMap
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    path_finder = PathFinder(tubemap, engine="heap")
+    reachable = {station.name: time for station, time in path_finder.reachable_within("Covent Garden", 2)}
+    assert reachable == {"Covent Garden": 0, "Holborn": 1, "Leicester Square": 1,
+                         "Tottenham Court Road": 2, "Chancery Lane": 2}
+
+    # Several origins: times from the closest one, in increasing order, within the budget
+    origins = ["Covent Garden", "Stockwell"]
+    results = list(path_finder.reachable_within(origins, 10))
+    times = [time for _, time in results]
+    assert times == sorted(times) and max(times) <= 10
+    assert len({station.id for station, _ in results}) == len(results)
+    for station, time in results:
+        assert time == min(path_finder.get_journey(origin, station.name).total_time
+                           if origin != station.name else 0 for origin in origins)
+    # Nothing reachable within the budget is left out
+    names = [station.name for station in tubemap.stations.values()]
+    matrix = path_finder.get_shortest_paths(origins, names, return_times=True)
+    within = {name for j, name in enumerate(names)
+              if any(row[j] is not None and row[j] <= 10 for row in matrix)}
+    assert {station.name for station, _ in results} == within
+    assert path_finder.reachable_within("Nowhere", 10) is None
+
+
+def test_path_with_changes():
+    """
+        Checks that interchange penalties trade travel time for fewer line changes.
+    """
+    from tube.map import TubeMap
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    path_finder = PathFinder(tubemap, engine="heap")
+
+    def time_and_changes(journey):
+        time = sum(min(connection.time for connection in path_finder.graph[station.id][next_station.id]
+                       if connection.line is line)
+                   for (station, _), (next_station, line) in zip(journey, journey[1:]))
+        lines = [line for _, line in journey[1:]]
+        return time, sum(line is not next_line for line, next_line in zip(lines, lines[1:]))
+
+    for start, end in [("Ealing Broadway", "Upminster"), ("Richmond", "Stratford"),
+                       ("Stockwell", "South Kensington")]:
+        fastest = path_finder.get_shortest_path_with_changes(start, end, interchange_penalty=0)
+        fewest = path_finder.get_shortest_path_with_changes(start, end, interchange_penalty=60)
+        for journey in (fastest, fewest):
+            assert journey[0] == (tubemap.stations[tubemap.get_station_id(start)], None)
+            assert journey[-1][0].name == end
+            # Each step uses a line connecting the two stations
+            for (station, _), (next_station, line) in zip(journey, journey[1:]):
+                assert line in [connection.line for connection in path_finder.graph[station.id][next_station.id]]
+        assert time_and_changes(fastest)[0] == path_finder.get_journey(start, end).total_time
+        assert time_and_changes(fewest)[1] <= time_and_changes(fastest)[1]
+    assert time_and_changes(path_finder.get_shortest_path_with_changes("Richmond", "Stratford", 60)) == (52, 1)
+
+
+def test_speed_and_csr_after_change():
+    """
+        Checks that the A* speed is kept up to date without recalibrating on every
+        change, and that a stale CSR graph is not used until it is built again.
+    """
+    from tube.map import TubeMap
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    astar = PathFinder(tubemap, engine="astar")
+    csr_finder = PathFinder(tubemap, engine="csr")
+    heap = PathFinder(tubemap, engine="heap")
+    astar.get_shortest_path("Covent Garden", "Green Park")
+    csr_finder.get_shortest_path("Covent Garden", "Green Park")
+    csr = csr_finder.csr
+
+    # A slower connection other than the fastest one keeps the speed
+    fastest = astar.max_speed_connection
+    connection = heap.get_journey("Covent Garden", "Green Park").connections[0]
+    tubemap.set_connection_time(connection, connection.time + 5)
+    assert (astar.max_speed, astar.max_speed_connection) == astar.calibrate_max_speed()
+    # A faster one raises it (no time at all disables the heuristic)
+    tubemap.set_connection_time(connection, 0)
+    assert astar.max_speed_connection is connection and astar.max_speed == float('inf')
+    assert (astar.max_speed, astar.max_speed_connection) == astar.calibrate_max_speed()
+    # Slowing down the fastest one recalibrates on the next query
+    tubemap.set_connection_time(connection, 10)
+    assert astar.max_speed is None
+    for start, end in [("Covent Garden", "Green Park"), ("Ealing Broadway", "Upminster")]:
+        assert astar.get_journey(start, end).total_time == heap.get_journey(start, end).total_time
+        assert csr_finder.get_journey(start, end).total_time == heap.get_journey(start, end).total_time
+    assert astar.max_speed_connection is fastest
+
+    # The CSR graph is marked stale instead of rebuilt
+    assert csr_finder.csr is csr and csr.stale
+    assert not csr_finder.build_csr().stale
+    assert csr_finder.get_journey("Covent Garden", "Green Park").total_time == \
+        heap.get_journey("Covent Garden", "Green Park").total_time
+
+
 if __name__ == "__main__":
     test_shortest_path()
-
+    test_astar()
+    test_journey()
+    test_incremental_update()
+    test_isolated_station()
+    test_precomputed_after_change()
+    test_listeners_released()
+    test_yen()
+    test_pareto()
+    test_result_cache()
+    test_tree_cache()
+    test_bidirectional()
+    test_shortest_paths()
+    test_reachable_within()
+    test_path_with_changes()
+    test_speed_and_csr_after_change()
@@ -0,0 +1,366 @@
+from array import array
+from bisect import bisect_left
+
+DAY = 24 * 60  # minutes in a day, added to times after midnight
+
+
+def parse_time(time):
+    """ Converts a time of day to minutes after midnight.
+
+    Args:
+        time (str or int): "HH:MM" string, or minutes after midnight.
+
+    Returns:
+        int: minutes after midnight.
+    """
+    if isinstance(time, str):
+        hours, minutes = time.split(':')
+        return int(hours) * 60 + int(minutes)
+    return int(time)
+
+
+def format_time(minutes):
+    """ Converts minutes after midnight to a "HH:MM" string.
+
+    Args:
+        minutes (int): minutes after midnight. Times after the next midnight
+                       (1440 and more) are wrapped to the time of day.
+
+    Returns:
+        str: the time of day as "HH:MM".
+    """
+    minutes %= DAY
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class Timetable:
+    """
+    Class attaching departures to the lines and connections of a TubeMap, and
+    answering earliest-arrival queries with the Connection Scan Algorithm.
+
+    Departures can be given in two ways:
+        - a service frequency per Line: every section of the line is served every
+          `headway` minutes in each direction, trains running from the terminals
+          along the line using Connection.time,
+        - explicit departure times per Connection and direction.
+
+    build() turns all departures into elementary connections (one train moving
+    between two adjacent stations) stored in contiguous arrays sorted by
+    departure time. A query scans these arrays once from the departure time.
+    Times after midnight are stored as 1440 minutes and more, so a service day
+    runs from its first train to its last train after midnight.
+
+    Attributes:
+        tubemap (TubeMap): The tube map the timetable applies to.
+        frequencies (dict): A dictionary mapping line ID (str) to a
+                            (headway, first departure, last departure) tuple.
+        departures (list): (Connection, from station ID, list of departure times) tuples.
+    """
+
+    def __init__(self, tubemap):
+        """
+        Args:
+            tubemap (TubeMap) : The TubeMap to attach the timetable to.
+        """
+        self.tubemap = tubemap
+        self.frequencies = {}
+        self.departures = []
+
+        # Station numbering as of the last build()
+        self.station_ids = []
+        self.index = {}
+
+        # Arrays filled in by build(), one entry per elementary connection
+        self.departure_station = array('i')
+        self.arrival_station = array('i')
+        self.departure_time = array('i')
+        self.arrival_time = array('i')
+        self.connection_index = array('i')
+
+    def set_line_frequency(self, line_id, headway, first_departure="05:30", last_departure="00:30"):
+        """ Sets a regular service on a line.
+
+        Args:
+            line_id (str): The ID of the line.
+            headway (int): Minutes between two trains.
+            first_departure (str or int): Departure time of the first train from each terminal.
+            last_departure (str or int): Departure time of the last train from each terminal.
+                Times earlier than first_departure are taken to be after midnight.
+
+        Returns:
+            None
+        """
+        first = parse_time(first_departure)
+        last = parse_time(last_departure)
+        if last < first:
+            last += DAY
+        self.frequencies[line_id] = (headway, first, last)
+
+    def add_departures(self, connection, from_station_id, departure_times):
+        """ Adds explicit departures on a connection in one direction.
+
+        Args:
+            connection (Connection): The connection the trains run on.
+            from_station_id (str): The ID of the station the trains leave from.
+            departure_times (list): Departure times as "HH:MM" strings or minutes,
+                1440 minutes and more for departures after midnight.
+
+        Returns:
+            None
+        """
+        self.departures.append((connection, from_station_id,
+                                [parse_time(time) for time in departure_times]))
+
+    def build(self):
+        """ Generates the sorted arrays of elementary connections.
+
+        Uses the stations and connections of the tube map at the time of the
+        call, so build() must be called again after the map changes.
+
+        Returns:
+            Timetable: self, to allow chaining.
+        """
+        self.station_ids = list(self.tubemap.station_ids)
+        self.index = dict(self.tubemap.station_index)
+        connections = self.tubemap.connections
+        connection_numbers = {id(connection): i for i, connection in enumerate(connections)}
+        events = set()
+
+        for connection, from_station_id, departure_times in self.departures:
+            # The connection was removed from the map since
+            if id(connection) not in connection_numbers:
+                continue
+            stationA, stationB = connection.stations
+            to_station_id = stationB.id if stationA.id == from_station_id else stationA.id
+            for time in departure_times:
+                events.add((time, time + connection.time, self.index[from_station_id],
+                            self.index[to_station_id], connection_numbers[id(connection)]))
+
+        for line_id, (headway, first, last) in self.frequencies.items():
+            line_graph = {}
+            for i, connection in enumerate(connections):
+                if connection.line.id != line_id:
+                    continue
+                stationA, stationB = connection.stations
+                line_graph.setdefault(stationA.id, {})[stationB.id] = i
+                line_graph.setdefault(stationB.id, {})[stationA.id] = i
+
+            # Minutes between a train leaving its terminal and leaving each section
+            # (station, next station), taken from the first route through the section.
+            # Routes sharing a section share its trains, so every section is served
+            # once per headway however many routes run through it.
+            # Routes are also walked in reverse, as a branch ending in a loop (for
+            # instance Heathrow on the Piccadilly line) has no terminal to start from.
+            offsets = {}
+            routes = self.line_routes(line_graph)
+            for route in routes + [route[::-1] for route in routes]:
+                offset = 0
+                for station_id, next_station_id in zip(route, route[1:]):
+                    offsets.setdefault((station_id, next_station_id), offset)
+                    offset += connections[line_graph[station_id][next_station_id]].time
+            # Any section no route runs through still gets trains from the start of service
+            for station_id, neighbours in line_graph.items():
+                for next_station_id in neighbours:
+                    offsets.setdefault((station_id, next_station_id), 0)
+
+            for (station_id, next_station_id), offset in offsets.items():
+                number = line_graph[station_id][next_station_id]
+                for start in range(first, last + 1, headway):
+                    events.add((start + offset, start + offset + connections[number].time,
+                                self.index[station_id], self.index[next_station_id], number))
+
+        events = sorted(events)
+        self.departure_time = array('i', [event[0] for event in events])
+        self.arrival_time = array('i', [event[1] for event in events])
+        self.departure_station = array('i', [event[2] for event in events])
+        self.arrival_station = array('i', [event[3] for event in events])
+        self.connection_index = array('i', [event[4] for event in events])
+        return self
+
+    def line_routes(self, line_graph):
+        """ Lists the routes trains follow on a line.
+
+        A route is a maximal simple path starting at a terminal (a station with a
+        single neighbour on the line). A line without terminals is a loop, and its
+        routes go round the loop in both directions back to the starting station.
+
+        Args:
+            line_graph (dict): A dictionary mapping station ID (str) to a dictionary
+                               {neighbour ID (str): connection number (int)} for one line.
+
+        Returns:
+            list[list[str]]: The station IDs along each route.
+        """
+        terminals = [station_id for station_id, neighbours in line_graph.items() if len(neighbours) == 1]
+        is_loop = not terminals
+        if is_loop and line_graph:
+            terminals = [min(line_graph)]
+
+        routes = []
+        for terminal in terminals:
+            stack = [[terminal]]
+            while stack:
+                route = stack.pop()
+                extensions = [neighbour for neighbour in line_graph[route[-1]] if neighbour not in route]
+                if not extensions:
+                    if is_loop and len(route) > 2 and route[0] in line_graph[route[-1]]:
+                        route = route + [route[0]]
+                    routes.append(route)
+                for neighbour in extensions:
+                    stack.append(route + [neighbour])
+        return routes
+
+    def earliest_arrival(self, start_station_name, end_station_name, departure_time):
+        """ Finds the earliest arrival at a station when leaving at a given time.
+
+        For instance, earliest_arrival('Stockwell', 'South Kensington', '08:13')
+        answers "leave Stockwell at 08:13, arrive at South Kensington when?".
+
+        Args:
+            start_station_name (str): name of the starting station
+            end_station_name (str): name of the ending station
+            departure_time (str or int): "HH:MM" string or minutes after midnight
+
+        Returns:
+            tuple: (arrival time in minutes, journey) where journey is a list of
+                (Station, Line, departure time, arrival time) tuples, one per
+                elementary connection taken. Times after midnight may be
+                1440 minutes and more, see format_time.
+                Returns None if a station does not exist, was added since the
+                last build(), or cannot be reached.
+        """
+        conversion_dict = self.tubemap.name_index
+        if start_station_name not in conversion_dict or end_station_name not in conversion_dict:
+            print('Input stations not valid. Please enter valid station names.')
+            return None
+
+        start_station_id = conversion_dict[start_station_name]
+        end_station_id = conversion_dict[end_station_name]
+        if start_station_id not in self.index or end_station_id not in self.index:
+            print('Timetable not built for these stations. Please call build() first.')
+            return None
+
+        start = self.index[start_station_id]
+        end = self.index[end_station_id]
+        time = parse_time(departure_time)
+        if start == end:
+            return time, []
+
+        arrival, in_connection = self.scan(start, end, time)
+        # Shortly after midnight, the trains still running are stored as 1440+ minutes
+        if time < DAY and self.departure_time and time + DAY <= self.departure_time[-1]:
+            late_arrival, late_in_connection = self.scan(start, end, time + DAY)
+            if late_arrival[end] - DAY < arrival[end]:
+                arrival, in_connection = late_arrival, late_in_connection
+
+        if arrival[end] == float('inf'):
+            return None
+
+        journey = []
+        station = end
+        while station != start:
+            i = in_connection[station]
+            connection = self.tubemap.connections[self.connection_index[i]]
+            journey.append((self.tubemap.stations[self.station_ids[station]], connection.line,
+                            self.departure_time[i], self.arrival_time[i]))
+            station = self.departure_station[i]
+        return arrival[end], journey[::-1]
+
+    def scan(self, start, end, time):
+        """ Runs the Connection Scan Algorithm from a station and time.
+
+        Args:
+            start (int): The number of the starting station.
+            end (int): The number of the ending station, used to stop the scan early.
+            time (int): The departure time in minutes.
+
+        Returns:
+            tuple: `arrival`, the earliest arrival time at each station number
+                (inf if not reached), and `in_connection`, the elementary
+                connection used to reach each station first (-1 if none).
+        """
+        arrival = [float('inf')] * len(self.station_ids)
+        arrival[start] = time
+        # Elementary connection used to reach each station first
+        in_connection = [-1] * len(self.station_ids)
+
+        departure_times = self.departure_time
+        arrival_times = self.arrival_time
+        departure_stations = self.departure_station
+        arrival_stations = self.arrival_station
+
+        # Scan from the first departure at or after the requested time
+        for i in range(bisect_left(departure_times, time), len(departure_times)):
+            # No later departure can improve the arrival at the end station
+            if departure_times[i] >= arrival[end]:
+                break
+            if arrival[departure_stations[i]] <= departure_times[i] \
+                    and arrival_times[i] < arrival[arrival_stations[i]]:
+                arrival[arrival_stations[i]] = arrival_times[i]
+                in_connection[arrival_stations[i]] = i
+        return arrival, in_connection
+
+
+def test_timetable():
+    from tube.map import TubeMap
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    timetable = Timetable(tubemap)
+    for line_id in tubemap.lines:
+        timetable.set_line_frequency(line_id, headway=5)
+    timetable.build()
+    print(f"{len(timetable.departure_time)} elementary connections")
+
+    arrival, journey = timetable.earliest_arrival("Stockwell", "South Kensington", "08:13")
+    print(format_time(arrival))
+    for station, line, departure, arrival in journey:
+        print(format_time(departure), format_time(arrival), station.name, line.name)
+    # The static travel time is a lower bound on the journey time
+    assert arrival >= parse_time("08:13") + 11
+
+    # Every section of a line is served once per headway, also on branches
+    kew_gardens = timetable.index[tubemap.get_station_id("Kew Gardens")]
+    richmond = timetable.index[tubemap.get_station_id("Richmond")]
+    trains = [i for i in range(len(timetable.departure_time))
+              if timetable.departure_station[i] == kew_gardens
+              and timetable.arrival_station[i] == richmond
+              and parse_time("08:00") <= timetable.departure_time[i] < parse_time("09:00")]
+    assert len(trains) == 12
+
+    # Every direction of every connection is served, also on the branch to the Heathrow loop
+    sections = set(zip(timetable.departure_station, timetable.arrival_station))
+    for connection in tubemap.connections:
+        stationA, stationB = connection.stations
+        a, b = timetable.index[stationA.id], timetable.index[stationB.id]
+        assert (a, b) in sections and (b, a) in sections, connection
+    assert timetable.earliest_arrival("Hounslow Central", "Dagenham Heathway", "08:13") is not None
+    assert timetable.earliest_arrival("Heathrow Terminal 4", "Angel", "12:00") is not None
+
+    # Trains still running after midnight are found from a query at "00:10"
+    arrival, journey = timetable.earliest_arrival("Stockwell", "Brixton", "00:10")
+    assert format_time(journey[0][2]) <= "00:30"
+
+
+def test_timetable_rebuild():
+    from tube.map import TubeMap
+    from tube.components import Station, Connection
+    tubemap = TubeMap()
+    timetable = Timetable(tubemap)
+    tubemap.import_from_json("./data/london.json")
+    timetable.set_line_frequency("4", headway=10)
+    # Not built yet
+    assert timetable.earliest_arrival("Kew Gardens", "Richmond", "08:00") is None
+    assert timetable.build().earliest_arrival("Kew Gardens", "Richmond", "08:00") is not None
+
+    # A new station on the line is served after build() is called again
+    station = Station("999", "Richmond Riverside", {4})
+    tubemap.add_station(station)
+    tubemap.add_connection(Connection({tubemap.stations["213"], station}, tubemap.lines["4"], 2))
+    assert timetable.earliest_arrival("Richmond", "Richmond Riverside", "08:00") is None
+    _, journey = timetable.build().earliest_arrival("Richmond", "Richmond Riverside", "08:00")
+    assert len(journey) == 1
+
+
+if __name__ == "__main__":
+    test_timetable()
+    test_timetable_rebuild()
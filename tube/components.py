@@ -1,7 +1,8 @@
+import sys
 
 
 class Station:
-    def __init__(self, id, name, zones):
+    def __init__(self, id, name, zones, latitude=None, longitude=None, display_name=None):
         """ A class representing a Tube station.
         
         Args:
@@ -9,10 +10,17 @@ class Station:
             name (str) : Station name
             zones (set[int]) : Set of zone numbers for station. Some stations
                                may belong to more than one zone.
+            latitude (float) : Latitude of the station in degrees (optional)
+            longitude (float) : Longitude of the station in degrees (optional)
+            display_name (str) : Name as displayed on the map, possibly with
+                                 HTML line breaks (optional)
         """
         self.id = id
         self.name = name
         self.zones = zones
+        self.latitude = latitude
+        self.longitude = longitude
+        self.display_name = display_name
 
     def __repr__(self):
         return f"Station({self.id}, {self.name}, {self.zones})"
@@ -54,6 +62,96 @@ class Connection:
         )
 
 
+class CompactStation:
+    """ Memory-lean variant of Station.
+
+    Same attributes and constructor as Station, but declared with __slots__,
+    so instances have no per-instance __dict__.
+    """
+    __slots__ = ('id', 'name', 'zones', 'latitude', 'longitude', 'display_name')
+
+    def __init__(self, id, name, zones, latitude=None, longitude=None, display_name=None):
+        self.id = id
+        self.name = name
+        self.zones = zones
+        self.latitude = latitude
+        self.longitude = longitude
+        self.display_name = display_name
+
+    def __repr__(self):
+        return f"Station({self.id}, {self.name}, {self.zones})"
+
+
+class CompactLine:
+    """ Memory-lean variant of Line, declared with __slots__."""
+    __slots__ = ('id', 'name')
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+    def __repr__(self):
+        return f"Line({self.id}, {self.name})"
+
+
+class CompactConnection:
+    """ Memory-lean variant of Connection.
+
+    Declared with __slots__, and the two stations are stored as a tuple instead
+    of a set, which saves a hash table per connection. Unpacking with
+    `stationA, stationB = connection.stations` works the same way.
+    """
+    __slots__ = ('stations', 'line', 'time')
+
+    def __init__(self, stations, line, time):
+        self.stations = tuple(stations)
+        self.line = line
+        self.time = time
+
+    def __repr__(self):
+        station_names = sorted([station.name for station in self.stations])
+        return (f"Connection("
+            f"{'<->'.join(station_names)}, {self.line.name}, {self.time})"
+        )
+
+
+def object_size(instance):
+    """ Returns the memory used by an instance itself, its __dict__ and, for
+    connections, its container of stations (the objects referenced are shared
+    and not counted).
+
+    Args:
+        instance : a Station, Line or Connection instance (plain or compact)
+
+    Returns:
+        int : size in bytes
+    """
+    size = sys.getsizeof(instance)
+    if hasattr(instance, '__dict__'):
+        size += sys.getsizeof(instance.__dict__)
+    if isinstance(instance, (Connection, CompactConnection)):
+        size += sys.getsizeof(instance.stations)
+    return size
+
+
+def memory_report():
+    """ Prints the memory used per object by the plain and compact classes."""
+    station_1 = Station("99", "Gloucester Road", {1}, 51.4945, -0.1829)
+    station_2 = Station("74", "Earl's Court", {1, 2}, 51.492, -0.1973)
+    line = Line("10", "Piccadilly Line")
+    pairs = [
+        ("Station", station_1,
+         CompactStation("99", "Gloucester Road", {1}, 51.4945, -0.1829)),
+        ("Line", line, CompactLine("10", "Piccadilly Line")),
+        ("Connection", Connection({station_1, station_2}, line, 3),
+         CompactConnection((station_1, station_2), line, 3)),
+    ]
+    for name, plain, compact in pairs:
+        plain_size, compact_size = object_size(plain), object_size(compact)
+        print(f"{name:<10} plain: {plain_size:>4} bytes, compact: {compact_size:>4} bytes, "
+              f"saved: {plain_size - compact_size} bytes per object")
+
+
 if __name__ == '__main__':
     # Two Station instances
     station_1 = Station(id="99",
@@ -80,4 +178,6 @@ if __name__ == '__main__':
     connection_2 = Connection(stations={station_1, station_2},
                             line=line_2,
                             time=4)
-                            
+
+    # Memory used per object by the plain and compact classes
+    memory_report()
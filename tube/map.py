@@ -1,6 +1,9 @@
 import json
+import weakref
 from json import JSONDecodeError
 from tube.components import Station, Line, Connection
+from tube.components import CompactStation, CompactLine, CompactConnection
+from tube.names import StationNameIndex, StationPrefixIndex
 
 class TubeMap:
     """
@@ -15,13 +18,55 @@ class TubeMap:
         lines (dict): A dictionary mapping line ID (str) to Line instances.
         connections (list): A list of Connection instances representing the connections
                             between stations on various lines.
+        name_index (dict): A dictionary mapping station name (str) to station ID (str),
+                           kept in sync with `stations`.
+        station_index (dict): A dictionary mapping station ID (str) to a dense
+                              station number (int) from 0 to N-1.
+        station_ids (list): The station ID (str) of each station number, the
+                            inverse of `station_index`.
+        connection_positions (dict): A dictionary mapping id() of each Connection to
+                                     its position in `connections`.
+        version (int): Counter incremented on every change to the map, so that
+                       derived data (such as path caches) can detect it is stale.
+        listeners (list): References to the functions called as
+                          listener(event, item) after every change. The events are
+                          "station_added" (item: Station), "connection_added",
+                          "connection_removed" and "connection_time_changed"
+                          (item: Connection), and "map_imported" (item: None) after
+                          import_from_json. Bound methods are held weakly, so a
+                          subscribed PathFinder can still be garbage collected.
+        fuzzy_index (StationNameIndex): Trigram index over station names, used by
+                                        find_stations. Built on the first call, so
+                                        maps that are never searched do not pay for it.
+        prefix_index (StationPrefixIndex): Sorted prefix index over station names
+                                           and display names, used by complete.
     """
 
-    def __init__(self):
-        """Initializes an empty TubeMap with no stations, lines, or connections."""
+    def __init__(self, compact=False):
+        """Initializes an empty TubeMap with no stations, lines, or connections.
+
+        Args:
+            compact (bool): If True, import_from_json creates the memory-lean
+                            CompactStation, CompactLine and CompactConnection
+                            classes (with __slots__ and tuple station pairs)
+                            instead of Station, Line and Connection.
+        """
+        if compact:
+            self.station_class, self.line_class, self.connection_class = \
+                CompactStation, CompactLine, CompactConnection
+        else:
+            self.station_class, self.line_class, self.connection_class = Station, Line, Connection
         self.stations = {}  # key: id (str), value: Station instance
         self.lines = {}  # key: id (str), value: Line instance
         self.connections = []  # list of Connection instances
+        self.connection_positions = {}  # key: id() of a Connection, value: position in connections
+        self.name_index = {}  # key: name (str), value: station id (str)
+        self.station_index = {}  # key: id (str), value: dense number (int)
+        self.station_ids = []  # station id (str) of each dense number
+        self.version = 0  # incremented on every change
+        self.listeners = []  # references to the functions notified of every change
+        self.fuzzy_index = None  # built on the first find_stations call
+        self.prefix_index = StationPrefixIndex()
 
     def import_from_json(self, filepath):
         """Imports tube map information from a JSON file.
@@ -54,6 +99,7 @@ class TubeMap:
         self.initiate_stations(data)
         self.initiate_lines(data)
         self.initiate_connections(data)
+        self.notify("map_imported", None)
 
         return
 
@@ -75,6 +121,11 @@ class TubeMap:
             station_id = station['id']          # Get id str
             name = station['name']              # Get name str
             zone = float(station['zone'])
+            latitude = float(station['latitude']) if 'latitude' in station else None
+            longitude = float(station['longitude']) if 'longitude' in station else None
+            display_name = station.get('display_name')
+            if display_name == 'NULL':
+                display_name = None
 
             # If station in two zones, create set of the integers
             if zone % 1 != 0:
@@ -82,10 +133,204 @@ class TubeMap:
             else:
                 zone = {int(zone)}
             # Create Station instance
-            self.stations[station_id] = Station(station_id, name, zone)
+            self.add_station(self.station_class(station_id, name, zone, latitude, longitude, display_name))
 
         return
 
+    def add_station(self, station):
+        """Adds a station to the map, keeping the name indexes in sync.
+
+        A new station gets the next dense station number. If a station with the
+        same ID already exists, it is replaced and keeps its number.
+
+        Args:
+            station (Station): The station to add.
+
+        Returns:
+            None
+        """
+        previous = self.stations.get(station.id)
+        if previous is not None:
+            if self.name_index.get(previous.name) == station.id:
+                del self.name_index[previous.name]
+            self.prefix_index.remove(previous.id, self.searchable_names(previous))
+        else:
+            self.station_index[station.id] = len(self.station_ids)
+            self.station_ids.append(station.id)
+        self.stations[station.id] = station
+        self.name_index[station.name] = station.id
+        if self.fuzzy_index is not None:
+            self.fuzzy_index.add(station.id, station.name)
+        self.prefix_index.add(station.id, self.searchable_names(station))
+        self.notify("station_added", station)
+
+    def add_connection(self, connection):
+        """Adds a connection to the map and notifies the listeners.
+
+        Args:
+            connection (Connection): The connection to add. Its stations and line
+                                     should already be part of the map.
+
+        Returns:
+            None
+        """
+        self.connection_positions[id(connection)] = len(self.connections)
+        self.connections.append(connection)
+        self.notify("connection_added", connection)
+
+    def remove_connection(self, connection):
+        """Removes a connection from the map and notifies the listeners.
+
+        The last connection of the list takes the place of the removed one, so
+        removing is O(1) but changes the order of `connections`.
+
+        Args:
+            connection (Connection): The connection to remove, as found in `connections`.
+
+        Returns:
+            None
+        """
+        position = self.connection_positions.get(id(connection))
+        if position is None or position >= len(self.connections) \
+                or self.connections[position] is not connection:
+            # Not added through add_connection or import_from_json
+            try:
+                position = self.connections.index(connection)
+            except ValueError:
+                print('Connection not in tube map, nothing removed')
+                return
+        self.connection_positions.pop(id(connection), None)
+        last = self.connections.pop()
+        if position < len(self.connections):
+            self.connections[position] = last
+            self.connection_positions[id(last)] = position
+        self.notify("connection_removed", connection)
+
+    def set_connection_time(self, connection, time):
+        """Changes the travel time of a connection and notifies the listeners.
+
+        Args:
+            connection (Connection): The connection to update, as found in `connections`.
+            time (int): The new travel time in minutes.
+
+        Returns:
+            None
+        """
+        connection.time = time
+        self.notify("connection_time_changed", connection)
+
+    def subscribe(self, listener):
+        """Registers a function to be called after every change to the map.
+
+        A bound method is only referenced weakly and is dropped once its object
+        is garbage collected. Other functions are kept until unsubscribe().
+
+        Args:
+            listener (function): Called as listener(event, item), see `listeners`.
+
+        Returns:
+            None
+        """
+        if hasattr(listener, '__self__'):
+            self.listeners.append(weakref.WeakMethod(listener))
+        else:
+            self.listeners.append(lambda: listener)
+
+    def unsubscribe(self, listener):
+        """Stops notifying a function previously registered with subscribe().
+
+        Args:
+            listener (function): The function to remove.
+
+        Returns:
+            None
+        """
+        self.listeners = [reference for reference in self.listeners
+                          if reference() not in (None, listener)]
+
+    def notify(self, event, item):
+        """Records a change to the map and passes it on to the listeners.
+
+        Args:
+            event (str): The kind of change, see `listeners`.
+            item (Station or Connection): The changed item, or None.
+
+        Returns:
+            None
+        """
+        self.version += 1
+        for reference in list(self.listeners):
+            listener = reference()
+            if listener is None:
+                # The subscribed object was garbage collected
+                self.listeners.remove(reference)
+            else:
+                listener(event, item)
+
+    def searchable_names(self, station):
+        """Lists the names a station can be found by in the prefix index.
+
+        Args:
+            station (Station): The station.
+
+        Returns:
+            list[str]: The station name, and its display name if it has one.
+        """
+        if station.display_name is None:
+            return [station.name]
+        return [station.name, station.display_name]
+
+    def get_station_id(self, name):
+        """Looks up the ID of a station from its name.
+
+        Args:
+            name (str): The exact station name.
+
+        Returns:
+            str: The station ID, or None if no station has this name.
+        """
+        return self.name_index.get(name)
+
+    def find_stations(self, query, limit=5):
+        """Finds the stations whose names best match some user input.
+
+        Matching ignores case, punctuation and common abbreviations, and
+        tolerates typos. For instance, "kings cross" finds
+        "King's Cross St. Pancras" and "Edgware Rd" finds both Edgware Road
+        stations.
+
+        Args:
+            query (str): The user input.
+            limit (int): The maximum number of matches returned.
+
+        Returns:
+            list[tuple]: (Station, score) tuples by decreasing score, where the
+                score is between 0 and 1 (1 for an exact match).
+        """
+        if self.fuzzy_index is None:
+            self.fuzzy_index = StationNameIndex()
+            for station in self.stations.values():
+                self.fuzzy_index.add(station.id, station.name)
+        return [(self.stations[station_id], score)
+                for station_id, score in self.fuzzy_index.search(query, limit)]
+
+    def complete(self, prefix, limit=10):
+        """Suggests stations for a partially typed name.
+
+        Stations whose name starts with the prefix come first, followed by
+        stations with a later word starting with it (for instance "cross"
+        suggests "Charing Cross" and "King's Cross St. Pancras"). Matching
+        ignores case and punctuation.
+
+        Args:
+            prefix (str): The text typed so far.
+            limit (int): The maximum number of suggestions.
+
+        Returns:
+            list[Station]: The suggested stations, in ranking order.
+        """
+        return [self.stations[station_id] for station_id in self.prefix_index.complete(prefix, limit)]
+
     def initiate_lines(self, data):         # Initiate self.lines
         """Helper method to initialize the `lines` attribute from JSON data.
 
@@ -101,7 +346,7 @@ class TubeMap:
         for line in lines_data:
             line_id = line['line']  # str
             name = line['name']     # str
-            self.lines[line_id] = Line(line_id, name)
+            self.lines[line_id] = self.line_class(line_id, name)
 
         return
 
@@ -126,7 +371,9 @@ class TubeMap:
             time = int(connection['time'])
             stations = {self.stations[station1], self.stations[station2]}   # Index self.stations dict to get station instance
             line = self.lines[line_id]                                      # Index self.lines dict to get line instance
-            self.connections.append(Connection(stations, line, time))
+            new_connection = self.connection_class(stations, line, time)
+            self.connection_positions[id(new_connection)] = len(self.connections)
+            self.connections.append(new_connection)
 
         return
 
@@ -149,5 +396,76 @@ def test_import():
         # view stations for the first Connection
         print([station for station in tubemap.connections[0].stations])
 
+
+def test_find_stations():
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    assert tubemap.fuzzy_index is None
+
+    # Case, punctuation, abbreviations and typos are tolerated
+    assert tubemap.find_stations("kings cross")[0][0].name == "King's Cross St. Pancras"
+    st_johns_wood = tubemap.stations[tubemap.get_station_id("St. John's Wood")]
+    assert tubemap.find_stations("st johns wood")[0] == (st_johns_wood, 1.0)
+    assert tubemap.find_stations("picadilly circus")[0][0].name == "Piccadilly Circus"
+    assert {station.name for station, _ in tubemap.find_stations("Edgware Rd", limit=2)} == \
+        {"Edgware Road (B)", "Edgware Road (C)"}
+    scores = [score for _, score in tubemap.find_stations("cross", limit=10)]
+    assert scores == sorted(scores, reverse=True)
+
+    # A renamed station is found by its new name only
+    station = tubemap.stations[tubemap.get_station_id("Kew Gardens")]
+    tubemap.add_station(Station(station.id, "Royal Botanic", station.zones))
+    assert tubemap.find_stations("royal botanic")[0][0].id == station.id
+    assert all(match.id != station.id for match, _ in tubemap.find_stations("kew gardens"))
+
+
+def test_compact_import():
+    from tube.components import object_size
+    from network.path import PathFinder
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    compact = TubeMap(compact=True)
+    compact.import_from_json("./data/london.json")
+
+    # Same data as the plain classes, in smaller objects
+    assert compact.station_ids == tubemap.station_ids
+    for station_id, station in tubemap.stations.items():
+        compact_station = compact.stations[station_id]
+        assert isinstance(compact_station, CompactStation) and not hasattr(compact_station, '__dict__')
+        assert (compact_station.name, compact_station.zones, compact_station.latitude) == \
+            (station.name, station.zones, station.latitude)
+        assert object_size(compact_station) < object_size(station)
+    assert [(sorted(s.id for s in c.stations), c.line.id, c.time) for c in compact.connections] == \
+        [(sorted(s.id for s in c.stations), c.line.id, c.time) for c in tubemap.connections]
+    assert object_size(compact.connections[0]) < object_size(tubemap.connections[0])
+
+    # Paths found on the compact map are the same
+    plain_finder, compact_finder = PathFinder(tubemap, engine="heap"), PathFinder(compact, engine="heap")
+    for start, end in [("Covent Garden", "Green Park"), ("Ealing Broadway", "Upminster")]:
+        assert [station.id for station in compact_finder.get_shortest_path(start, end)] == \
+            [station.id for station in plain_finder.get_shortest_path(start, end)]
+        assert compact_finder.get_journey(start, end).total_time == plain_finder.get_journey(start, end).total_time
+
+
+def test_remove_connection():
+    tubemap = TubeMap()
+    tubemap.import_from_json("./data/london.json")
+    count = len(tubemap.connections)
+    first, last = tubemap.connections[0], tubemap.connections[-1]
+    tubemap.remove_connection(first)
+    assert len(tubemap.connections) == count - 1 and first not in tubemap.connections
+    # The last connection took its place
+    assert tubemap.connections[0] is last
+    assert all(tubemap.connection_positions[id(connection)] == i
+               for i, connection in enumerate(tubemap.connections))
+
+    tubemap.add_connection(first)
+    tubemap.remove_connection(last)
+    tubemap.remove_connection(last)     # already removed: nothing happens
+    assert len(tubemap.connections) == count - 1 and tubemap.connections[0] is first
+
 if __name__ == "__main__":
     test_import()
+    test_find_stations()
+    test_compact_import()
+    test_remove_connection()
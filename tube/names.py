@@ -0,0 +1,347 @@
+import heapq
+import math
+import re
+from array import array
+from collections import Counter
+from itertools import chain
+from bisect import bisect_left, insort
+
+# Abbreviations expanded during normalisation, so "Edgware Rd" matches "Edgware Road"
+ABBREVIATIONS = {
+    'rd': 'road',
+    'sq': 'square',
+    'pk': 'park',
+    'stn': 'station',
+}
+
+
+def normalise_name(name):
+    """ Normalises a station name for matching.
+
+    Removes HTML tags, lowercases the name, replaces "&" by "and", drops
+    punctuation (so that "St. John's Wood" and "St Johns Wood" are equal) and
+    expands a few common abbreviations.
+
+    Args:
+        name (str): The station name or user input.
+
+    Returns:
+        str: The normalised name, words separated by single spaces.
+    """
+    name = re.sub(r'<[^>]+>', ' ', name)     # HTML line breaks in display names
+    name = name.lower().replace('&', ' and ')
+    name = re.sub(r"[.'’]", '', name)
+    words = re.sub(r'[^a-z0-9]+', ' ', name).split()
+    return ' '.join(ABBREVIATIONS.get(word, word) for word in words)
+
+
+def trigrams(text):
+    """ Splits a normalised name into its set of character trigrams.
+
+    The text is padded with spaces, so short names and word starts still
+    produce trigrams.
+
+    Args:
+        text (str): A normalised name.
+
+    Returns:
+        set[str]: The trigrams of the text.
+    """
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class StationNameIndex:
+    """
+    Class indexing station names by trigram, used for fuzzy and case-insensitive
+    station lookup.
+
+    Every station gets a small slot number. Postings are arrays of slots,
+    grouped by the number of trigrams of the names, so memory only grows with
+    the total number of trigrams in the names. A name of n trigrams scores at
+    least `threshold` only if it shares ceil(threshold * (q + n) / 2) of the
+    q query trigrams, which it must then have in one of the rarest postings of
+    its group. So a query only reads the rare postings of the name lengths
+    that can still beat the best scores found, lengths closest to the query
+    first, and the long postings of common trigrams are usually never read.
+
+    Attributes:
+        gram_ids (dict): A dictionary mapping a trigram (str) to its number (int).
+        postings (dict): A dictionary mapping a number of trigrams (int) to a
+                         dictionary {trigram number (int): array('i') of the
+                         slots of the names of that length containing it}.
+        slots (dict): A dictionary mapping station ID (str) to its slot (int).
+        slot_ids (list): The station ID (str) in each slot, None for a free slot.
+        slot_grams (list): An array('i') of the trigram numbers of the name in
+                           each slot, empty for a free slot.
+    """
+
+    def __init__(self):
+        """Initializes an empty index."""
+        self.gram_ids = {}
+        self.postings = {}
+        self.slots = {}
+        self.slot_ids = []
+        self.slot_grams = []
+        self.free_slots = []
+
+    def add(self, station_id, name):
+        """ Adds a station name to the index, replacing its previous name if any.
+
+        Args:
+            station_id (str): The ID of the station.
+            name (str): The station name.
+
+        Returns:
+            None
+        """
+        self.remove(station_id)
+        slot = self.free_slots.pop() if self.free_slots else len(self.slot_ids)
+        grams = array('i', [self.gram_ids.setdefault(gram, len(self.gram_ids))
+                            for gram in trigrams(normalise_name(name))])
+        group = self.postings.setdefault(len(grams), {})
+        for gram_id in grams:
+            group.setdefault(gram_id, array('i')).append(slot)
+        if slot == len(self.slot_ids):
+            self.slot_ids.append(station_id)
+            self.slot_grams.append(grams)
+        else:
+            self.slot_ids[slot] = station_id
+            self.slot_grams[slot] = grams
+        self.slots[station_id] = slot
+
+    def remove(self, station_id, name=None):
+        """ Removes a station name from the index.
+
+        Args:
+            station_id (str): The ID of the station.
+            name (str): The station name it was added with. Not needed, as the
+                        index keeps the trigrams of every name.
+
+        Returns:
+            None
+        """
+        slot = self.slots.pop(station_id, None)
+        if slot is None:
+            return
+        grams = self.slot_grams[slot]
+        group = self.postings[len(grams)]
+        for gram_id in grams:
+            group[gram_id].remove(slot)
+            if not group[gram_id]:
+                del group[gram_id]
+        if not group:
+            del self.postings[len(grams)]
+        self.slot_ids[slot] = None
+        self.slot_grams[slot] = array('i')
+        self.free_slots.append(slot)
+
+    def search(self, query, limit=5, min_score=0.3):
+        """ Finds the station names most similar to a query.
+
+        The score is the Dice coefficient of the two trigram sets:
+        2 * shared trigrams / (query trigrams + name trigrams), 1.0 for an exact
+        match after normalisation.
+
+        Args:
+            query (str): The user input.
+            limit (int): The maximum number of matches returned.
+            min_score (float): Matches scoring below this are left out.
+
+        Returns:
+            list[tuple]: (station ID, score) tuples by decreasing score.
+        """
+        grams = trigrams(normalise_name(query))
+        gram_ids = {self.gram_ids[gram] for gram in grams if gram in self.gram_ids}
+        if not gram_ids or limit <= 0:
+            return []
+
+        threshold = min_score
+        best = []       # heap of the `limit` best scores so far
+        scores = []
+        # Names about as long as the query first, as they usually score best
+        for length in sorted(self.postings, key=lambda length: abs(length - len(grams))):
+            # A name of this length shares at most min(length, known query trigrams) trigrams
+            if 2 * min(length, len(gram_ids)) / (len(grams) + length) < threshold:
+                continue
+            group = self.postings[length]
+            postings = sorted((group[gram_id] for gram_id in gram_ids if gram_id in group), key=len)
+            # Trigrams a name of this length must share to reach the threshold
+            needed = max(1, math.ceil(threshold * (len(grams) + length) / 2 - 1e-9))
+            if len(postings) < needed:
+                continue
+            # Such a name is in at least `needed` postings, so in at least three of
+            # the rarest ones when all but needed - 3 postings are read. Few names
+            # are, and only those are checked one by one.
+            unread = max(0, needed - 3)
+            counts = Counter(chain.from_iterable(postings[:len(postings) - unread]))
+            for slot in [slot for slot, count in counts.items() if count + unread >= needed]:
+                shared = counts[slot] if not unread else len(gram_ids.intersection(self.slot_grams[slot]))
+                score = 2 * shared / (len(grams) + length)
+                if score < threshold:
+                    continue
+                scores.append((self.slot_ids[slot], score))
+                heapq.heappush(best, score)
+                if len(best) > limit:
+                    heapq.heappop(best)
+                if len(best) == limit:
+                    threshold = max(threshold, best[0])
+        return heapq.nsmallest(limit, scores, key=lambda score: (-score[1], score[0]))
+
+
+class StationPrefixIndex:
+    """
+    Class indexing station names in sorted arrays for prefix autocompletion.
+
+    Two sorted lists of (normalised key, station ID) tuples are kept: one with
+    the full names, and one with every later word start of each name (for
+    "kings cross st pancras": "cross st pancras", "st pancras" and "pancras").
+    A prefix query is a binary search followed by a scan of the matching
+    range only, so it never visits the whole list.
+
+    Attributes:
+        full_names (list): Sorted (key, station ID) tuples for full names.
+        word_starts (list): Sorted (key, station ID) tuples for later word starts.
+    """
+
+    def __init__(self):
+        """Initializes an empty index."""
+        self.full_names = []
+        self.word_starts = []
+
+    def keys(self, names):
+        """ Computes the full-name and word-start keys of a station.
+
+        Args:
+            names (list[str]): The names the station can be found by.
+
+        Returns:
+            tuple: (set of full-name keys, set of word-start keys).
+        """
+        full_keys = set()
+        word_keys = set()
+        for name in names:
+            words = normalise_name(name).split()
+            if not words:
+                continue
+            full_keys.add(' '.join(words))
+            for i in range(1, len(words)):
+                word_keys.add(' '.join(words[i:]))
+        return full_keys, word_keys - full_keys
+
+    def add(self, station_id, names):
+        """ Adds a station to the index.
+
+        Args:
+            station_id (str): The ID of the station.
+            names (list[str]): The names the station can be found by.
+
+        Returns:
+            None
+        """
+        full_keys, word_keys = self.keys(names)
+        for key in full_keys:
+            insort(self.full_names, (key, station_id))
+        for key in word_keys:
+            insort(self.word_starts, (key, station_id))
+
+    def remove(self, station_id, names):
+        """ Removes a station from the index.
+
+        Args:
+            station_id (str): The ID of the station.
+            names (list[str]): The names the station was added with.
+
+        Returns:
+            None
+        """
+        full_keys, word_keys = self.keys(names)
+        for entries, keys in ((self.full_names, full_keys), (self.word_starts, word_keys)):
+            for key in keys:
+                i = bisect_left(entries, (key, station_id))
+                if i < len(entries) and entries[i] == (key, station_id):
+                    del entries[i]
+
+    def complete(self, prefix, limit=10):
+        """ Finds the stations with a name or word starting with a prefix.
+
+        Args:
+            prefix (str): The text typed so far.
+            limit (int): The maximum number of station IDs returned.
+
+        Returns:
+            list[str]: Station IDs, full-name matches first, each group in
+                alphabetical order.
+        """
+        prefix = normalise_name(prefix)
+        if not prefix:
+            return []
+
+        results = []
+        for entries in (self.full_names, self.word_starts):
+            i = bisect_left(entries, (prefix,))
+            while i < len(entries) and len(results) < limit and entries[i][0].startswith(prefix):
+                if entries[i][1] not in results:
+                    results.append(entries[i][1])
+                i += 1
+        return results
+
+
+def test_name_index():
+    index = StationNameIndex()
+    names = {"1": "King's Cross St. Pancras", "2": "Edgware Road (Bakerloo)",
+             "3": "Edgware Road (Circle Line)", "4": "Earl's Court", "5": "Charing Cross"}
+    for station_id, name in names.items():
+        index.add(station_id, name)
+
+    assert index.search("kings cross", limit=1)[0][0] == "1"
+    assert {station_id for station_id, _ in index.search("Edgware Rd", limit=2)} == {"2", "3"}
+    assert index.search("earls court")[0] == ("4", 1.0)
+
+    # Same scores as comparing the query with every name
+    query = trigrams(normalise_name("charing cros"))
+    expected = sorted(((station_id, 2 * len(query & trigrams(normalise_name(name)))
+                        / (len(query) + len(trigrams(normalise_name(name)))))
+                       for station_id, name in names.items()), key=lambda score: (-score[1], score[0]))
+    assert index.search("charing cros", limit=5, min_score=0) == \
+        [score for score in expected if score[1] > 0]
+
+    # A removed station is no longer found, and its slot is reused
+    index.remove("5", names["5"])
+    assert all(station_id != "5" for station_id, _ in index.search("charing cross"))
+    index.add("6", "Charing Cross")
+    assert index.search("charing cross")[0] == ("6", 1.0)
+    assert len(index.slot_ids) == 5
+
+    # Adding a station again replaces its name, and no empty postings are left
+    index.add("6", "Embankment")
+    assert index.search("embankment")[0] == ("6", 1.0)
+    assert all(station_id != "6" for station_id, _ in index.search("charing cross"))
+    assert all(posting for group in index.postings.values() for posting in group.values())
+
+
+def test_prefix_index():
+    index = StationPrefixIndex()
+    names = {"1": ["King's Cross St. Pancras"], "2": ["Charing Cross"], "3": ["Kingsbury"],
+             "4": ["Acton Town", "Acton<br />Town"], "5": ["Crossharbour & London Arena"]}
+    for station_id, station_names in names.items():
+        index.add(station_id, station_names)
+
+    # Full-name matches first, then later word starts, each in alphabetical order
+    assert index.complete("king") == ["1", "3"]
+    assert index.complete("cross") == ["5", "2", "1"]
+    assert index.complete("CROSS", limit=2) == ["5", "2"]
+    assert index.complete("st pan") == ["1"]
+    assert index.complete("crossharbour and") == ["5"]
+    # A display name equal to the name once normalised gives a single entry
+    assert index.complete("acton") == ["4"] and len(index.full_names) == 5
+    assert index.complete("") == [] and index.complete("xyz") == []
+
+    index.remove("1", names["1"])
+    assert index.complete("king") == ["3"]
+    assert index.complete("pancras") == []
+
+
+if __name__ == "__main__":
+    test_name_index()
+    test_prefix_index()